@@ -1,31 +1,22 @@
 ### count frequency :
 
-from transformers import pipeline
-from sklearn.feature_extraction.text import CountVectorizer
+from model_registry import ModelRegistry
+from vocabulary import count_words
 import nltk
 
 def countFrequency(text):
 
-    vectorizer = CountVectorizer(stop_words='english')
-    X = vectorizer.fit_transform([text])
-    count_words = vectorizer.get_feature_names_out()    
-    
-    word_frequencies = {}
-    word_counts = X.toarray().sum(axis=0)
-
-    for word_index, word in enumerate(count_words):
-        word_frequencies[word] = int(word_counts[word_index])
-
-    sorted_words = sorted(word_frequencies.items(), key=lambda x: x[1], reverse=True)
+    # Uses the shared analyzer instead of fitting a new vectorizer per text
+    word_frequencies = count_words(text)
 
-    top_10_words = sorted_words[:10]
+    top_10_words = [(term["word"], term["frequency"]) for term in word_frequencies[:10]]
 
     return top_10_words
 
 ### check emotions:
 
 def checkEmotions(text):
-    emotion_classifier = pipeline('text-classification', model='AdamCodd/tinybert-emotion-balanced')
+    emotion_classifier = ModelRegistry.get('emotion')
     
     result = emotion_classifier(text)
 
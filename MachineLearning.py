@@ -1,8 +1,17 @@
 from config import openai_key
 import openai
 import json
+import time
+import datetime
+import copy
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Tuple, Union
+from model_registry import ModelRegistry
 
 # Abstract API Client
 class APIClient(ABC):
@@ -13,8 +22,12 @@ class APIClient(ABC):
 
 # Concrete OpenAI Client
 class OpenAIClient(APIClient):
-    def __init__(self, api_key: str):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, timeout: float = 60.0, model: str = 'gpt-4o-mini',
+                 max_retries: int = 2):
+        # The request timeout stops a stalled call from holding a pool worker forever;
+        # it applies to each attempt, so a call can take (max_retries + 1) times as long
+        self.client = openai.OpenAI(api_key=api_key, timeout=timeout, max_retries=max_retries)
+        self.model = model
     
     def analyze(self, text: str, questions: List[str] = None, 
                 response_format: Dict = None) -> Dict:
@@ -82,7 +95,7 @@ class OpenAIClient(APIClient):
         print(f"Analyzing with prompt length: {len(prompt)}")
         try:
             response = self.client.chat.completions.create(
-                model='gpt-4o-mini',
+                model=self.model,
                 messages=[
                     {'role': 'system', 'content': 'You are a specialized journal analysis assistant. Always return valid JSON in the exact format requested.'},
                     {'role': 'user', 'content': prompt}
@@ -153,6 +166,278 @@ class MockMLClient(APIClient):
             "Triggers": {"Joy": ["testing"]}
         }
 
+class TieredEmotionClient(APIClient):
+    """Answers the emotion template with the local tinybert classifier when it is confident.
+    
+    Everything else goes to `llm_client`: other templates and custom
+    questions (they need generative output), fused requests, long texts
+    and entries the classifier is unsure about. The local tier gives
+    scores only, so its results have empty Triggers.
+    
+    Classifier probabilities are mapped onto the LLM's 0-100 ratings
+    through `calibration`, so stored scores read the same whichever tier
+    produced them. The classifier has no disgust label, so Disgust is 0.
+    Local results are tagged "source": "local" to show which tier scored them.
+    """
+    
+    # tinybert-emotion-balanced labels onto the emotion template; it has no disgust label
+    LABELS = {"joy": "Joy", "love": "Joy", "sadness": "Sadness", "anger": "Anger",
+              "fear": "Fear", "surprise": "Surprise"}
+    EMOTIONS = ["Joy", "Sadness", "Anger", "Fear", "Surprise", "Disgust"]
+    # (probability, LLM rating) points, interpolated linearly. Refit them
+    # from entries scored by both tiers when the model or prompt changes.
+    DEFAULT_CALIBRATION = [(0.0, 0), (0.1, 20), (0.3, 45), (0.6, 70), (1.0, 95)]
+    
+    def __init__(self, llm_client: APIClient, confidence_threshold: float = 0.6,
+                 max_local_chars: int = 2000,
+                 calibration: Optional[List[Tuple[float, float]]] = None):
+        self.llm_client = llm_client
+        self.confidence_threshold = confidence_threshold
+        self.max_local_chars = max_local_chars
+        self.calibration = sorted(calibration or self.DEFAULT_CALIBRATION)
+        # Distinct cache keys from results produced by the LLM alone, or
+        # cached before local scores were calibrated
+        self.model = f"tiered:calibrated:{getattr(llm_client, 'model', type(llm_client).__name__)}"
+        self.lock = threading.Lock()
+        self.counters = {
+            "local": 0,
+            "escalated_low_confidence": 0,
+            "escalated_generative": 0,
+            "local_errors": 0
+        }
+        self.latency = {"local": [0, 0.0], "llm": [0, 0.0]}
+    
+    def _record(self, counter: Optional[str], tier: str, seconds: float) -> None:
+        with self.lock:
+            if counter:
+                self.counters[counter] += 1
+            self.latency[tier][0] += 1
+            self.latency[tier][1] += seconds
+    
+    @staticmethod
+    def _is_emotion_request(response_format: Optional[Dict]) -> bool:
+        # OpenAIClient falls back to the emotion format when none is given
+        if response_format is None:
+            return True
+        emotion_format = AnalysisTemplateRegistry.get_template("emotion")["format"]["format"]
+        return response_format.get("format") == emotion_format
+    
+    def calibrate(self, probability: float) -> int:
+        """Map a classifier probability onto the LLM's 0-100 rating"""
+        points = self.calibration
+        if probability <= points[0][0]:
+            return round(points[0][1])
+        for (low_p, low_score), (high_p, high_score) in zip(points, points[1:]):
+            if probability <= high_p:
+                fraction = (probability - low_p) / (high_p - low_p) if high_p > low_p else 1.0
+                return round(low_score + fraction * (high_score - low_score))
+        return round(points[-1][1])
+    
+    def classify_locally(self, text: str) -> Dict:
+        """Emotion template scores on the LLM scale and the confidence in the top emotion"""
+        classifier = ModelRegistry.get("emotion")
+        predictions = classifier(text, top_k=None, truncation=True)
+        if predictions and isinstance(predictions[0], list):
+            predictions = predictions[0]
+        
+        # joy and love both map to Joy, so confidence is judged on the summed scores
+        probabilities = {emotion: 0.0 for emotion in self.LABELS.values()}
+        for prediction in predictions:
+            emotion = self.LABELS.get(prediction["label"].lower())
+            if emotion:
+                probabilities[emotion] += prediction["score"]
+        
+        result = {emotion: self.calibrate(probabilities.get(emotion, 0.0)) for emotion in self.EMOTIONS}
+        # No disgust label: report none rather than leave a gap readers must skip
+        result["Disgust"] = 0
+        result["Triggers"] = {}
+        result["source"] = "local"
+        confidence = max(probabilities.values(), default=0.0)
+        return {"result": result, "confidence": confidence}
+    
+    def _escalate(self, counter: str, text: str, questions: List[str],
+                  response_format: Dict) -> Dict:
+        started = time.perf_counter()
+        result = self.llm_client.analyze(text, questions=questions, response_format=response_format)
+        self._record(counter, "llm", time.perf_counter() - started)
+        return result
+    
+    def analyze(self, text: str, questions: List[str] = None, 
+                response_format: Dict = None) -> Dict:
+        if not self._is_emotion_request(response_format) or len(text) > self.max_local_chars:
+            return self._escalate("escalated_generative", text, questions, response_format)
+        
+        started = time.perf_counter()
+        try:
+            local = self.classify_locally(text)
+        except Exception as e:
+            print(f"Local emotion classifier failed, using the LLM: {e}")
+            self._record("local_errors", "local", time.perf_counter() - started)
+            return self._escalate(None, text, questions, response_format)
+        
+        if local["confidence"] < self.confidence_threshold:
+            self._record(None, "local", time.perf_counter() - started)
+            return self._escalate("escalated_low_confidence", text, questions, response_format)
+        
+        self._record("local", "local", time.perf_counter() - started)
+        return local["result"]
+    
+    def stats(self) -> Dict:
+        """Requests per tier, escalation rate and mean latency per tier"""
+        with self.lock:
+            stats = dict(self.counters)
+            # Emotion requests the local tier tried; a local error escalates too
+            escalated = stats["escalated_low_confidence"] + stats["local_errors"]
+            emotion_requests = stats["local"] + escalated
+            stats["escalation_rate"] = escalated / emotion_requests if emotion_requests else 0.0
+            for tier, (count, seconds) in self.latency.items():
+                stats[f"{tier}_calls"] = count
+                stats[f"{tier}_mean_ms"] = round(seconds / count * 1000, 1) if count else 0.0
+            stats["confidence_threshold"] = self.confidence_threshold
+        return stats
+
+# Persistent storage for cached analysis results
+class AnalysisCacheStore(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict]:
+        pass
+    
+    @abstractmethod
+    def set(self, key: str, value: Dict) -> None:
+        pass
+
+class SQLiteAnalysisCacheStore(AnalysisCacheStore):
+    """Stores analysis results in a local SQLite file, expiring after `ttl_seconds`"""
+    
+    def __init__(self, path: str = "analysis_cache.sqlite3", ttl_seconds: int = 7 * 24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+    
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM analysis_cache WHERE key = ? AND created_at > ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set(self, key: str, value: Dict) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            # Drop expired rows as we go so the file does not grow without bound
+            self.connection.execute(
+                "DELETE FROM analysis_cache WHERE created_at <= ?",
+                (time.time() - self.ttl_seconds,)
+            )
+
+class MongoAnalysisCacheStore(AnalysisCacheStore):
+    """Stores analysis results in a Mongo collection with a TTL index"""
+    
+    def __init__(self, collection, ttl_seconds: int = 7 * 24 * 3600):
+        self.collection = collection
+        self.collection.create_index("created_at", expireAfterSeconds=ttl_seconds)
+    
+    def get(self, key: str) -> Optional[Dict]:
+        document = self.collection.find_one({"_id": key}, {"value": 1})
+        return document["value"] if document else None
+    
+    def set(self, key: str, value: Dict) -> None:
+        self.collection.replace_one(
+            {"_id": key},
+            {"_id": key, "value": value, "created_at": datetime.datetime.now(datetime.timezone.utc)},
+            upsert=True
+        )
+
+# Caching decorator for any API client
+class CachingAPIClient(APIClient):
+    """Serves repeated analyses from cache instead of calling the model again.
+    
+    Results are keyed by a hash of (text, questions, response_format, model).
+    A bounded in-process LRU sits in front of an optional persistent store.
+    Error responses are never cached.
+    """
+    
+    def __init__(self, client: APIClient, max_entries: int = 256,
+                 store: Optional[AnalysisCacheStore] = None):
+        self.client = client
+        self.max_entries = max_entries
+        self.store = store
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+    
+    def cache_key(self, text: str, questions: List[str] = None,
+                  response_format: Dict = None) -> str:
+        model = getattr(self.client, "model", type(self.client).__name__)
+        payload = json.dumps([text, questions, response_format, model], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def analyze(self, text: str, questions: List[str] = None, 
+                response_format: Dict = None) -> Dict:
+        key = self.cache_key(text, questions, response_format)
+        
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return copy.deepcopy(self.memory[key])
+        
+        if self.store:
+            try:
+                result = self.store.get(key)
+            except Exception as e:
+                print(f"Analysis cache lookup failed: {e}")
+                result = None
+            if result is not None:
+                with self.lock:
+                    self.persistent_hits += 1
+                self._remember(key, result)
+                return copy.deepcopy(result)
+        
+        with self.lock:
+            self.misses += 1
+        result = self.client.analyze(text, questions=questions, response_format=response_format)
+        
+        if "error" not in result:
+            self._remember(key, result)
+            if self.store:
+                try:
+                    self.store.set(key, result)
+                except Exception as e:
+                    print(f"Analysis cache write failed: {e}")
+        return copy.deepcopy(result)
+    
+    def _remember(self, key: str, result: Dict) -> None:
+        with self.lock:
+            self.memory[key] = copy.deepcopy(result)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring how many model calls the cache saves"""
+        with self.lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "max_entries": self.max_entries
+            }
+
 # Command Pattern
 class Command(ABC):
     @abstractmethod
@@ -178,9 +463,10 @@ class AnalyzeTextCommand(Command):
 # Factory for creating the appropriate API client
 class APIClientFactory:
     @staticmethod
-    def create_client(client_type: str = "openai", api_key: Optional[str] = None) -> APIClient:
+    def create_client(client_type: str = "openai", api_key: Optional[str] = None,
+                      timeout: float = 60.0, max_retries: int = 2) -> APIClient:
         if client_type.lower() == "openai":
-            return OpenAIClient(api_key or openai_key)
+            return OpenAIClient(api_key or openai_key, timeout=timeout, max_retries=max_retries)
         elif client_type.lower() == "mock":
             return MockMLClient()
         # Add more client types as needed
@@ -304,6 +590,26 @@ class AnalysisTemplateRegistry:
             "format": response_format
         }
     
+    @classmethod
+    def build_fused_template(cls, template_names: List[str]) -> Dict:
+        """Merge several templates into one, namespacing each format by template key"""
+        questions = [
+            "Answer each group of questions below separately. Put the answers to the "
+            "questions marked [name] in the JSON object under the key \"name\"."
+        ]
+        response_format = {"format": {}, "example": {}}
+        
+        for template_name in template_names:
+            template = cls.get_template(template_name)
+            questions.extend(f"[{template_name}] {question}" for question in template["questions"])
+            response_format["format"][template_name] = template["format"]["format"]
+            if "example" in template["format"]:
+                response_format["example"][template_name] = template["format"]["example"]
+        
+        if not response_format["example"]:
+            del response_format["example"]
+        return {"questions": questions, "format": response_format}
+    
     @classmethod
     def list_templates(cls) -> List[str]:
         """List all available template names"""
@@ -311,8 +617,40 @@ class AnalysisTemplateRegistry:
 
 # Facade for ML operations
 class MLService:
-    def __init__(self, client_type: str = "openai", api_key: Optional[str] = None):
-        self.api_client = APIClientFactory.create_client(client_type, api_key)
+    # Web threads assumed when sizing the template pool by default
+    DEFAULT_WEB_THREADS = 8
+    # How often to check whether queued template calls have started
+    QUEUE_POLL_SECONDS = 0.5
+    
+    def __init__(self, client_type: str = "openai", api_key: Optional[str] = None,
+                 max_workers: Optional[int] = None, template_timeout: float = 60.0,
+                 fuse_templates: bool = False, cache_size: int = 256,
+                 cache_store: Optional[AnalysisCacheStore] = None,
+                 tiered: bool = False, local_confidence_threshold: float = 0.6,
+                 max_retries: int = 1,
+                 local_calibration: Optional[List[Tuple[float, float]]] = None):
+        # A call that times out here keeps its pool worker until the client gives
+        # up, so every attempt together must fit in the template timeout
+        attempt_timeout = template_timeout / (max_retries + 1)
+        self.api_client = APIClientFactory.create_client(
+            client_type, api_key, timeout=attempt_timeout, max_retries=max_retries)
+        self.tiered_client = None
+        if tiered:
+            self.tiered_client = TieredEmotionClient(
+                self.api_client, local_confidence_threshold, calibration=local_calibration)
+            self.api_client = self.tiered_client
+        if cache_size > 0:
+            self.api_client = CachingAPIClient(self.api_client, cache_size, cache_store)
+        # Shared pool so template calls for one entry run side by side;
+        # bounded so concurrent requests cannot open unlimited LLM calls.
+        # One worker per template per web thread keeps requests from queuing;
+        # abandoned calls hold theirs for at most about one more template timeout.
+        if max_workers is None:
+            max_workers = self.DEFAULT_WEB_THREADS * len(AnalysisTemplateRegistry.list_templates())
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="template-analysis")
+        self.template_timeout = template_timeout
+        self.fuse_templates = fuse_templates
     
     def analyze_text(self, text: str, questions: List[str] = None, 
                     response_format: Dict = None) -> Dict:
@@ -334,8 +672,93 @@ class MLService:
             response_format=template["format"]
         )
     
-    def analyze_with_multiple_templates(self, text: str, template_names: List[str]) -> Dict:
-        """Analyze text using multiple templates and combine results"""
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Return analysis cache counters, or None if caching is disabled"""
+        if isinstance(self.api_client, CachingAPIClient):
+            return self.api_client.stats()
+        return None
+    
+    def get_tier_stats(self) -> Optional[Dict]:
+        """Return local/LLM tier counters, or None if tiering is disabled"""
+        if self.tiered_client is not None:
+            return self.tiered_client.stats()
+        return None
+    
+    def _analyze_concurrently(self, text: str, template_names: List[str]) -> Dict[str, Any]:
+        """Run one request per template on the pool; failures are returned as exceptions
+        
+        Each template's timeout starts when a worker picks the call up, so
+        time spent queued behind other requests does not count against it.
+        """
+        started = {}
+        
+        def run(template_name: str) -> Dict:
+            started[template_name] = time.monotonic()
+            return self.analyze_with_template(text, template_name)
+        
+        pending = {
+            template_name: self.executor.submit(run, template_name)
+            for template_name in template_names
+        }
+        
+        outcomes = {}
+        while pending:
+            now = time.monotonic()
+            for template_name, future in list(pending.items()):
+                if future.done():
+                    try:
+                        outcomes[template_name] = future.result()
+                    except Exception as e:
+                        outcomes[template_name] = e
+                elif template_name in started and now - started[template_name] >= self.template_timeout:
+                    # The client's own timeout ends the call shortly; cancel in case it has not started
+                    future.cancel()
+                    outcomes[template_name] = TimeoutError(
+                        f"Timed out after {self.template_timeout} seconds")
+                else:
+                    continue
+                del pending[template_name]
+            
+            if pending:
+                # Wake on the next completion or deadline; poll while calls are still queued
+                waits = [started[name] + self.template_timeout - now for name in pending if name in started]
+                if len(waits) < len(pending):
+                    waits.append(self.QUEUE_POLL_SECONDS)
+                wait(pending.values(), timeout=max(0, min(waits)), return_when=FIRST_COMPLETED)
+        return outcomes
+    
+    def _analyze_fused(self, text: str, template_names: List[str]) -> Dict[str, Any]:
+        """Answer all templates with one request and split the result per template"""
+        try:
+            fused_template = AnalysisTemplateRegistry.build_fused_template(template_names)
+            combined = self.analyze_text(
+                text,
+                questions=fused_template["questions"],
+                response_format=fused_template["format"]
+            )
+        except Exception as e:
+            return {template_name: e for template_name in template_names}
+        
+        # A failed request fails every template it was answering
+        if "error" in combined:
+            return {template_name: combined for template_name in template_names}
+        
+        outcomes = {}
+        for template_name in template_names:
+            section = combined.get(template_name)
+            if isinstance(section, dict):
+                outcomes[template_name] = section
+            else:
+                outcomes[template_name] = {"error": f"Response is missing the '{template_name}' section"}
+        return outcomes
+    
+    def analyze_with_multiple_templates(self, text: str, template_names: List[str],
+                                        fused: Optional[bool] = None) -> Dict:
+        """Analyze text using multiple templates and combine results
+        
+        With `fused`, all templates are answered by a single LLM request
+        instead of one request per template.
+        """
         results = {}
 
         # Make sure we have at least one template
@@ -343,30 +766,36 @@ class MLService:
             # Default to emotion if no templates specified
             template_names = ["emotion"]
         
-        # Process each template with proper error handling
+        if fused is None:
+            fused = self.fuse_templates
+        
+        if fused and len(template_names) > 1:
+            outcomes = self._analyze_fused(text, template_names)
+        else:
+            outcomes = self._analyze_concurrently(text, template_names)
+        
+        # Process each template's outcome with proper error handling
         for template_name in template_names:
-            try:
-                # Analyze with this template
-                template_results = self.analyze_with_template(text, template_name)
-                
-                # Check if the result contains an error
-                if "error" in template_results:
-                    print(f"Warning: Template {template_name} returned an error: {template_results['error']}")
-                    # Store a simplified error response
-                    results[template_name] = {
-                        "error": f"Analysis with template '{template_name}' failed",
-                        "details": template_results.get("error", "Unknown error")
-                    }
-                else:
-                    # Store successful results
-                    results[template_name] = template_results
-            except Exception as e:
-                print(f"Error analyzing with template {template_name}: {str(e)}")
+            template_results = outcomes[template_name]
+            
+            if isinstance(template_results, Exception):
+                print(f"Error analyzing with template {template_name}: {str(template_results)}")
                 # Store error but continue with other templates
                 results[template_name] = {
                     "error": f"Analysis with template '{template_name}' failed",
-                    "details": str(e)
+                    "details": str(template_results)
+                }
+            # Check if the result contains an error
+            elif "error" in template_results:
+                print(f"Warning: Template {template_name} returned an error: {template_results['error']}")
+                # Store a simplified error response
+                results[template_name] = {
+                    "error": f"Analysis with template '{template_name}' failed",
+                    "details": template_results.get("error", "Unknown error")
                 }
+            else:
+                # Store successful results
+                results[template_name] = template_results
         
         # If all templates failed, return a top-level error
         if all("error" in results.get(template, {}) for template in template_names):
@@ -0,0 +1,136 @@
+from typing import Dict, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import logging
+import os
+import socket
+import uuid
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class AnalysisJobQueue:
+    """Runs journal analysis jobs on a local worker pool.
+
+    Jobs are recorded in a Mongo collection so their status can be polled
+    from any web worker and unfinished jobs can be picked up again after a
+    restart. The `handler` receives the job document and returns the result
+    to store on it; `on_failure` is called with the job and the error when
+    the handler raises.
+
+    Every process shares the collection, so a job is claimed atomically
+    before it runs: a pending job, or a running job whose lease has expired
+    because its worker died. The lease must outlast the longest analysis.
+    The journal text is dropped once a job finishes, so the collection
+    does not keep a second copy of every entry.
+    """
+
+    def __init__(self, collection, handler: Callable[[Dict], Dict], max_workers: int = 4,
+                 on_failure: Optional[Callable[[Dict, Exception], None]] = None,
+                 lease_seconds: int = 600):
+        self.collection = collection
+        self.handler = handler
+        self.on_failure = on_failure
+        self.lease_seconds = lease_seconds
+        # Identifies this process's claims
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="analysis-job")
+        self.collection.create_index("status")
+
+    @staticmethod
+    def _now(offset_seconds: float = 0) -> str:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (now + datetime.timedelta(seconds=offset_seconds)).isoformat()
+
+    def _claimable(self) -> Dict:
+        """Jobs nobody is working on: pending, or running on an expired lease"""
+        return {"$or": [
+            {"status": PENDING},
+            {"status": RUNNING, "lease_expires_at": {"$lt": self._now()}}
+        ]}
+
+    def enqueue(self, payload: Dict) -> str:
+        """Record a new job and hand it to the worker pool"""
+        job_id = uuid.uuid4().hex
+        job = dict(payload)
+        job.update({
+            "_id": job_id,
+            "status": PENDING,
+            "created_at": self._now(),
+            "updated_at": self._now()
+        })
+        self.collection.insert_one(job)
+        self.executor.submit(self._run, job_id)
+        logger.info(f"Enqueued analysis job: {job_id}")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get a job's status and result, without the journal text"""
+        job = self.collection.find_one({"_id": job_id}, {"text": 0})
+        if job:
+            job["job_id"] = job.pop("_id")
+        return job
+
+    def resume_unfinished(self) -> int:
+        """Submit jobs that are pending or whose worker's lease has expired.
+
+        Jobs another live process is running keep a valid lease and are
+        left alone; a pending job submitted by several processes is run by
+        whichever claims it first.
+        """
+        job_ids = [job["_id"] for job in self.collection.find(self._claimable(), {"_id": 1})]
+        for job_id in job_ids:
+            self.executor.submit(self._run, job_id)
+        if job_ids:
+            logger.info(f"Resumed {len(job_ids)} unfinished analysis jobs")
+        return len(job_ids)
+
+    def _run(self, job_id: str) -> None:
+        claim = self._claimable()
+        claim["_id"] = job_id
+        job = self.collection.find_one_and_update(
+            claim,
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "owner": self.owner,
+                    "lease_expires_at": self._now(self.lease_seconds),
+                    "updated_at": self._now()
+                },
+                "$inc": {"attempts": 1}
+            }
+        )
+        if not job:
+            return
+
+        # Only the current owner may finish the job
+        owned = {"_id": job_id, "owner": self.owner}
+        try:
+            result = self.handler(job)
+            self.collection.update_one(
+                owned,
+                {"$set": {"status": COMPLETED, "result": result, "updated_at": self._now()},
+                 "$unset": {"text": ""}}
+            )
+            logger.info(f"Completed analysis job: {job_id}")
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {e}")
+            self.collection.update_one(
+                owned,
+                {"$set": {"status": FAILED, "error": str(e), "updated_at": self._now()},
+                 "$unset": {"text": ""}}
+            )
+            if self.on_failure is not None:
+                try:
+                    self.on_failure(job, e)
+                except Exception as failure_error:
+                    logger.error(f"Failure handler for analysis job {job_id} failed: {failure_error}")
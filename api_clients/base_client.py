@@ -27,6 +27,10 @@ class BaseAIClient(ABC):
         
         return response_text, new_conversation_id, raw_response
     
+    async def close(self):
+        """Release network resources such as pooled connections"""
+        pass
+    
     @abstractmethod
     async def _call_api(self, input_text, system_prompt, conversation_id):
         """Make the actual API call to the specific AI provider - to be implemented by subclasses"""
@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import aiohttp
 import config
 from .base_client import BaseAIClient
 
@@ -7,15 +8,44 @@ class OpenAIClient(BaseAIClient):
         super().__init__(user_repository)
         self.api_key = api_key or config.openai_key
         self.default_model = default_model or config.default_model
+        # Requests in flight at once; further commands wait for a free slot
+        self.max_concurrent_requests = getattr(config, "openai_max_concurrent_requests", 8)
+        self.timeout = aiohttp.ClientTimeout(
+            total=getattr(config, "openai_timeout", 60),
+            connect=getattr(config, "openai_connect_timeout", 10)
+        )
+        # Created on first use, inside the running event loop
+        self._session = None
+        self._semaphore = None
+    
+    def _get_session(self):
+        """Shared keep-alive session, so commands reuse pooled connections"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrent_requests,
+                keepalive_timeout=getattr(config, "openai_keepalive_timeout", 30)
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        return self._session
+    
+    async def close(self):
+        """Close the pooled session; the next call opens a new one"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def _call_api(self, input_text, system_prompt, conversation_id):
         """OpenAI-specific API call implementation"""
         try:
             url = "https://api.openai.com/v1/responses"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
             
             data = {
                 "model": self.default_model,
@@ -29,15 +59,18 @@ class OpenAIClient(BaseAIClient):
             if conversation_id:
                 data["previous_response_id"] = conversation_id
             
-            response = requests.post(url, headers=headers, json=data)
-            
-            if response.status_code == 200:
-                response_dict = response.json()
-                reply = response_dict["output"][0]["content"][0]["text"].strip()
-                new_conversation_id = response_dict["id"]
-                return reply, new_conversation_id, response_dict
-            else:
-                raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
+            session = self._get_session()
+            async with self._semaphore:
+                async with session.post(url, json=data) as response:
+                    if response.status == 200:
+                        response_dict = await response.json()
+                        reply = response_dict["output"][0]["content"][0]["text"].strip()
+                        new_conversation_id = response_dict["id"]
+                        return reply, new_conversation_id, response_dict
+                    else:
+                        raise Exception(f"OpenAI API error: {response.status} - {await response.text()}")
                 
+        except asyncio.TimeoutError:
+            return f"Error with OpenAI API: request timed out after {self.timeout.total} seconds", None, None
         except Exception as e:
-            return f"Error with OpenAI API: {e}", None, None 
\ No newline at end of file
+            return f"Error with OpenAI API: {e}", None, None
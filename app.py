@@ -1,11 +1,32 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, Response, stream_with_context
 from flask_cors import CORS
 import traceback
-from application_logic import ServiceLocator
+import datetime
+import hashlib
+import re
+import zoneinfo
+from application_logic import ServiceLocator, FeatureDisabledError
+from mood_rollups import PERIODS
+from mood_timeseries import RESOLUTIONS
+import journal_export
+import serialization
 
 print("starting api")
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "X-Analysis-Token", "ETag"])
+
+# Upper bound for the `limit` query parameter on paginated endpoints
+MAX_PAGE_SIZE = 1000
+# Default and upper bound for points per series on the time-series endpoint
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+# Default and upper bound for similar-entry results
+DEFAULT_SIMILAR_ENTRIES = 5
+MAX_SIMILAR_ENTRIES = 50
+# Default page size for search results
+DEFAULT_SEARCH_RESULTS = 20
+# Upper bound for the number of entries in one bulk ingestion request
+MAX_BULK_ENTRIES = 500
 
 # Initialize services
 service_locator = ServiceLocator.get_instance()
@@ -20,25 +41,362 @@ def health_check():
     """Simple health check endpoint"""
     return jsonify({"status": "healthy"})
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Runtime counters such as analysis cache hits and misses"""
+    return jsonify(journal_service.get_metrics())
+
 @app.route("/templates", methods=["GET"])
 def list_templates():
     """Return a list of available analysis templates"""
     templates = journal_service.get_available_templates()
-    return jsonify({"templates": templates})
+    etag = resource_etag(",".join(templates))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify({"templates": templates}), etag)
+
+def resource_etag(version):
+    """ETag for the requested path and query string at a given data version"""
+    return hashlib.sha1(f"{request.full_path}|{version}".encode("utf-8")).hexdigest()[:20]
+
+def user_etag(username):
+    """ETag from the user's version counter, read without touching entries; None for unknown users"""
+    version = journal_service.get_user_version(username)
+    return resource_etag(version) if version is not None else None
+
+def not_modified(etag):
+    """A 304 response if the client already holds `etag`, otherwise None"""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(Response(status=304), etag)
+
+def with_etag(response, etag):
+    # no-cache makes browsers revalidate with If-None-Match on every fetch
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def json_response(payload, status=200, headers=None):
+    """Serialize with the configured fast serializer and compress for the client.
+    
+    Unlike jsonify, this handles ObjectId and datetime values in Mongo documents.
+    """
+    body, encoding = serialization.compress(
+        serialization.dumps(payload), request.headers.get("Accept-Encoding", ""))
+    response = Response(body, status=status, mimetype="application/json", headers=headers)
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+def parse_date_range():
+    """Read `from`/`to` query parameters as ISO timestamp bounds.
+
+    `from` is inclusive and `to` is exclusive; a bare date (YYYY-MM-DD) for
+    `to` covers that whole day.
+    """
+    start = request.args.get('from')
+    end = request.args.get('to')
+    for value in (start, end):
+        if value:
+            datetime.datetime.fromisoformat(value)
+    if end and len(end) == 10:
+        end = (datetime.date.fromisoformat(end) + datetime.timedelta(days=1)).isoformat()
+    return start or None, end or None
+
+def normalize_timestamp(value):
+    """An ISO-8601 timestamp with a UTC offset, converted to UTC in the stored format"""
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    # fromisoformat only accepts a trailing Z from Python 3.11
+    parsed = datetime.datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    if parsed.tzinfo is None:
+        raise ValueError(f"Timestamp must include a UTC offset: {value}")
+    return parsed.astimezone(datetime.timezone.utc).isoformat(timespec="microseconds")
+
+def parse_timezone():
+    """Read the `tz` query parameter: an IANA zone name or a +HH:MM offset; None for UTC.
+    
+    An unencoded "+" in a query string decodes to a space, so " 02:00" means "+02:00".
+    """
+    tz = request.args.get('tz')
+    if tz and re.fullmatch(r" \d{2}:?\d{2}", tz):
+        tz = "+" + tz[1:]
+    if not tz or tz.upper() in ("UTC", "Z", "+00:00"):
+        return None
+    if re.fullmatch(r"[+-]\d{2}:?\d{2}", tz):
+        return tz
+    try:
+        zoneinfo.ZoneInfo(tz)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {tz}")
+    return tz
+
+def parse_limit():
+    """Read the `limit` query parameter, capped at MAX_PAGE_SIZE"""
+    limit = request.args.get('limit')
+    if limit is None:
+        return None
+    limit = int(limit)
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
 
 @app.route("/history/<username>/", methods=["GET"])
 def user_history(username):
     try:
-        history = journal_service.get_journal_history(username)
-        if history:
-            return jsonify(list(history))
-        else:
-            return jsonify({"message": "User not found"}), 404
+        try:
+            start, end = parse_date_range()
+            limit = parse_limit()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        cursor = request.args.get('cursor')
+        
+        etag = user_etag(username)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        # Without range or paging parameters, keep the original full-history response
+        if not any([start, end, limit, cursor]):
+            history = journal_service.get_journal_history(username)
+            if history:
+                return with_etag(json_response(list(history)), etag)
+            else:
+                return jsonify({"message": "User not found"}), 404
+        
+        try:
+            page = journal_service.get_journal_history_page(
+                username, start=start, end=end, limit=limit, cursor=cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        response = json_response(page["entries"])
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        return with_etag(response, etag)
     except Exception as e:
         print(f"Error retrieving history: {e}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route("/search/<username>", methods=["GET"])
+def search_journal(username):
+    """Ranked full-text search over entry titles, text, triggers and theme evidence"""
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({"error": "Missing search query: q"}), 400
+        try:
+            limit = parse_limit() or DEFAULT_SEARCH_RESULTS
+            offset = int(request.args.get('offset', 0))
+            if offset < 0:
+                raise ValueError("offset must not be negative")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        page = journal_service.search_journal(username, query, limit, offset)
+        
+        return json_response({
+            "username": username,
+            "q": query,
+            "results": page["results"],
+            "next_offset": page["next_offset"]
+        })
+    
+    except Exception as e:
+        print(f"Error searching journal: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/similar/<username>", methods=["GET", "POST"])
+def similar_entries(username):
+    """Past entries most similar to a saved entry (?entry_id=) or to a text (?q= or JSON "text")"""
+    try:
+        post = request.get_json(silent=True) or {}
+        entry_id = request.args.get('entry_id') or post.get('entry_id')
+        text = request.args.get('q') or post.get('text')
+        if not entry_id and not text:
+            return jsonify({"error": "Provide entry_id or a text to compare"}), 400
+        try:
+            k = int(request.args.get('k', post.get('k', DEFAULT_SIMILAR_ENTRIES)))
+        except (TypeError, ValueError):
+            return jsonify({"error": "k must be an integer"}), 400
+        k = max(1, min(k, MAX_SIMILAR_ENTRIES))
+        
+        try:
+            results = journal_service.find_similar_entries(username, entry_id=entry_id, text=text, k=k)
+        except FeatureDisabledError as e:
+            return jsonify({"error": str(e)}), 501
+        
+        if results is None:
+            return jsonify({"error": f"Entry not indexed: {entry_id}"}), 404
+        return jsonify({"username": username, "results": results})
+    
+    except Exception as e:
+        print(f"Error finding similar entries: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/vocabulary/<username>", methods=["GET"])
+def user_vocabulary(username):
+    """Most frequent words of a user's entries, optionally within from/to"""
+    try:
+        try:
+            start, end = parse_date_range()
+            limit = parse_limit() or 50
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        terms = journal_service.get_vocabulary(username, start, end, limit)
+        return jsonify({
+            "username": username,
+            "from": request.args.get('from'),
+            "to": request.args.get('to'),
+            "terms": terms
+        })
+    
+    except Exception as e:
+        print(f"Error retrieving vocabulary: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/sync/<username>", methods=["GET"])
+def sync_history(username):
+    """Entries and activities changed since the `since` cursor of the previous sync.
+    
+    `from`/`to` limit the entries to a timestamp range, as on /history.
+    Recent changes are sent again on the next sync, so clients merge the
+    results by entry_id and activity_id.
+    """
+    try:
+        try:
+            start, end = parse_date_range()
+            changes = journal_service.sync_journal(
+                username, cursor=request.args.get('since'), start=start, end=end)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if changes is None:
+            return jsonify({"message": "User not found"}), 404
+        return json_response(changes)
+    
+    except Exception as e:
+        print(f"Error syncing history: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/export/<username>", methods=["GET"])
+def export_journal(username):
+    """Stream a user's full journal as NDJSON (default) or a JSON array.
+    
+    `since` and `since_entry_id`, the timestamp and entry_id of the last
+    entry received, resume an interrupted export after that entry. With
+    `since` alone, entries at that timestamp are sent again. The body is
+    gzip-compressed when the client accepts it.
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in journal_export.FORMATS:
+            return jsonify({"error": f"Unknown export format: {export_format}"}), 400
+        since = request.args.get('since') or None
+        if since:
+            try:
+                datetime.datetime.fromisoformat(since)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        
+        if not journal_service.user_exists(username):
+            return jsonify({"message": "User not found"}), 404
+        
+        entries = journal_service.export_journal(
+            username, since, since_entry_id=request.args.get('since_entry_id') or None)
+        body = journal_export.encode(entries, export_format)
+        headers = {
+            "Content-Disposition": f'attachment; filename="{username}-journal.{export_format}"'
+        }
+        # Exports are streamed, and only gzip is compressed incrementally
+        if serialization.negotiate_encoding(
+                request.headers.get("Accept-Encoding", ""), supported=("gzip",)) == "gzip":
+            body = journal_export.gzip_chunks(body)
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+        return Response(stream_with_context(body),
+                        mimetype=journal_export.FORMATS[export_format], headers=headers)
+    
+    except Exception as e:
+        print(f"Error exporting journal: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/mood_calendar/<username>", methods=["GET"])
+def mood_calendar(username):
+    """Per-day (or per-week/month) average emotion scores and entry counts.
+    
+    `tz` (e.g. Europe/Warsaw or +02:00) buckets days in the client's time
+    zone instead of UTC; weeks and months are always UTC.
+    """
+    try:
+        try:
+            start, end = parse_date_range()
+            tz = parse_timezone()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        period = request.args.get('period', 'day')
+        if period not in PERIODS:
+            return jsonify({"error": f"Unknown period: {period}. Expected one of {PERIODS}"}), 400
+        
+        days = journal_service.get_mood_calendar(username, start, end, period, tz)
+        return jsonify({
+            "username": username,
+            "from": request.args.get('from'),
+            "to": request.args.get('to'),
+            "period": period,
+            "days": days
+        })
+    
+    except Exception as e:
+        print(f"Error retrieving mood calendar: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/timeseries/<username>", methods=["GET"])
+def mood_timeseries(username):
+    """Emotion series bucketed to a resolution, with min/mean/max per bucket"""
+    try:
+        try:
+            start, end = parse_date_range()
+            points = int(request.args.get('max_points', request.args.get('points', DEFAULT_SERIES_POINTS)))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        points = max(3, min(points, MAX_SERIES_POINTS))
+        
+        resolution = request.args.get('resolution', 'day')
+        if resolution not in RESOLUTIONS:
+            return jsonify({"error": f"Unknown resolution: {resolution}. Expected one of {RESOLUTIONS}"}), 400
+        
+        downsample = request.args.get('downsample', 'lttb')
+        if downsample not in ('lttb', 'none'):
+            return jsonify({"error": f"Unknown downsample method: {downsample}"}), 400
+        
+        series = journal_service.get_mood_timeseries(
+            username, start, end, resolution,
+            max_points=points if downsample == 'lttb' else None)
+        return jsonify({
+            "username": username,
+            "from": request.args.get('from'),
+            "to": request.args.get('to'),
+            "resolution": resolution,
+            "series": series
+        })
+    
+    except Exception as e:
+        print(f"Error retrieving time series: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/activities/<username>/", methods=["GET"])
 def user_activities(username):
     """Get suggested activities for a user"""
@@ -46,13 +404,18 @@ def user_activities(username):
         # Get query parameters
         include_completed = request.args.get('include_completed', 'false').lower() == 'true'
         
+        etag = user_etag(username)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         # Get activities from service
         activities = journal_service.get_user_activities(username, include_completed)
         
-        return jsonify({
+        return with_etag(json_response({
             "activities": activities,
             "count": len(activities)
-        })
+        }), etag)
         
     except Exception as e:
         print(f"Error retrieving activities: {e}")
@@ -118,16 +481,21 @@ def user_templates(username):
     """Get or update a user's template preferences"""
     try:
         if request.method == "GET":
+            etag = user_etag(username)
+            cached = not_modified(etag)
+            if cached:
+                return cached
+            
             # Get the user's current template preferences
             templates = journal_service.get_user_template_preferences(username)
             
             if templates is None:
                 return jsonify({"error": "User not found"}), 404
                 
-            return jsonify({
+            return with_etag(jsonify({
                 "username": username,
                 "templates": templates
-            })
+            }), etag)
             
         elif request.method == "PUT":
             # Update the user's template preferences
@@ -187,6 +555,11 @@ def new_journal_entry():
         # Get custom questions and format if provided
         custom_questions = post.get("questions")
         custom_format = post.get("format")
+        # Opt-in: answer all templates with a single LLM request
+        fused = post.get("fused")
+        # Token from an earlier "analyze" call whose result can be saved as-is
+        analysis_token = post.get("analysis_token")
+        response_headers = {}
         
         print(post)
 
@@ -195,28 +568,95 @@ def new_journal_entry():
                 text, 
                 templates=templates,
                 custom_questions=custom_questions,
-                custom_format=custom_format
+                custom_format=custom_format,
+                fused=fused
             )
+            # Only template analyses can be saved later, not custom questions
+            if not (custom_questions and custom_format):
+                token = journal_service.issue_analysis_token(username, text, templates, analysis)
+                if token:
+                    response_headers["X-Analysis-Token"] = token
         
         elif action == "analyze_and_save":
             analysis = journal_service.analyze_and_store_journal(
-                username, text, title, templates=templates
+                username, text, title, templates=templates, fused=fused,
+                analysis_token=analysis_token
             )
         
+        elif action == "analyze_and_save_async":
+            # Respond as soon as the entry is stored; poll /jobs/<job_id> for the analysis
+            analysis = journal_service.analyze_and_store_journal_async(
+                username, text, title, templates=templates, fused=fused
+            )
+            if analysis.get("save_status"):
+                return json_response(analysis, 202)
+        
         elif action == "submit":
             classification = post.get("classification", {})
-            analysis = journal_service.save_journal(username, text, title, classification)
+            analysis = journal_service.save_journal(
+                username, text, title, classification, analysis_token=analysis_token)
         
         else:
             return jsonify({"error": f"Unknown action: {action}"}), 400
         
         print(analysis)
-        return jsonify(analysis)
+        return json_response(analysis, 200, response_headers)
     
     except Exception as e:
         print(f"Error processing journal entry: {e}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route("/journal_entries/bulk", methods=["POST"])
+def bulk_journal_entries():
+    """Analyze and save a batch of journal entries for one user"""
+    try:
+        post = request.get_json()
+        if not post:
+            return jsonify({"error": "Invalid request format"}), 400
+        
+        username = post.get("username")
+        entries = post.get("entries")
+        if not username or not isinstance(entries, list) or not entries:
+            return jsonify({"error": "Missing required fields: username and a list of entries"}), 400
+        if len(entries) > MAX_BULK_ENTRIES:
+            return jsonify({"error": f"Too many entries; at most {MAX_BULK_ENTRIES} per request"}), 400
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict) or not entry.get("title") or not entry.get("text"):
+                return jsonify({"error": f"Entry {index} is missing title or text"}), 400
+            if entry.get("classification") is not None and not isinstance(entry["classification"], dict):
+                return jsonify({"error": f"Entry {index}: classification must be an object"}), 400
+            # Stored timestamps are compared as strings, so they must share one format
+            if entry.get("timestamp") is not None:
+                try:
+                    entry["timestamp"] = normalize_timestamp(entry["timestamp"])
+                except ValueError as e:
+                    return jsonify({"error": f"Entry {index}: {e}"}), 400
+        
+        result = journal_service.analyze_and_store_many(
+            username, entries,
+            templates=post.get("templates"),
+            fused=post.get("fused")
+        )
+        return jsonify(result)
+    
+    except Exception as e:
+        print(f"Error processing bulk journal entries: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Get the status of a background analysis job"""
+    try:
+        job = journal_service.get_analysis_job(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        print(f"Error retrieving job status: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == "__main__":
     app.run(debug=True, port=8800)
\ No newline at end of file
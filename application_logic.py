@@ -1,9 +1,24 @@
+import config
 import database_layer
-from MachineLearning import MLService, AnalysisTemplateRegistry
+from database_layer import FeatureDisabledError
+import mood_timeseries
+import journal_search
+from MachineLearning import (MLService, AnalysisTemplateRegistry,
+                             SQLiteAnalysisCacheStore, MongoAnalysisCacheStore)
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Iterator, Tuple
 import datetime
 import logging
+import base64
+import hashlib
+import json
+import secrets
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from analysis_jobs import AnalysisJobQueue
+from model_registry import ModelRegistry
 from activity_suggestion import suggest_activity_from_analysis, SuggestedActivity
 
 print("importing application logic")
@@ -22,12 +37,14 @@ class AnalyzeJournalCommand(JournalCommand):
     def __init__(self, text: str, ml_service: MLService, 
                  analysis_templates: Union[str, List[str]] = None,
                  custom_questions: List[str] = None,
-                 custom_format: Dict = None):
+                 custom_format: Dict = None,
+                 fused: Optional[bool] = None):
         self.text = text
         self.ml_service = ml_service
         self.analysis_templates = analysis_templates
         self.custom_questions = custom_questions
         self.custom_format = custom_format
+        self.fused = fused
     
     def execute(self) -> Dict:
         # If custom questions and format are provided, use them directly
@@ -43,7 +60,8 @@ class AnalyzeJournalCommand(JournalCommand):
             print()
             return self.ml_service.analyze_with_multiple_templates(
                 self.text, 
-                self.analysis_templates
+                self.analysis_templates,
+                fused=self.fused
             )
         
         # If a single template is provided as a string, use that template
@@ -57,17 +75,19 @@ class AnalyzeJournalCommand(JournalCommand):
         return self.ml_service.analyze_with_template(self.text, "emotion")
 
 class SaveJournalCommand(JournalCommand):
-    def __init__(self, repository, username: str, text: str, title: str, classification: Dict):
+    def __init__(self, repository, username: str, text: str, title: str, classification: Dict,
+                 entry_id: Optional[str] = None):
         self.repository = repository
         self.username = username
         self.text = text
         self.title = title
         self.classification = classification
+        self.entry_id = entry_id
     
     def execute(self) -> Dict:
         # Save the journal entry
         success = self.repository.save_journal(
-            self.username, self.text, self.title, self.classification)
+            self.username, self.text, self.title, self.classification, entry_id=self.entry_id)
         
         result = {"success": success, "message": "Journal saved" if success else "Failed to save journal"}
         
@@ -142,20 +162,147 @@ class SuggestActivityCommand(JournalCommand):
             "suggested_activity": activity_suggestion
         }
 
+class AnalysisTokenStore:
+    """Keeps recent analysis results server-side under short-lived opaque tokens.
+    
+    A token issued by the "analyze" action lets a following save reuse the
+    analysis instead of sending the same text to the model again. Tokens are
+    bound to the username and text they were issued for and are single use.
+    """
+    
+    def __init__(self, ttl_seconds: int = 1800, max_tokens: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_tokens = max_tokens
+        self.tokens = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _fingerprint(username: str, text: str) -> str:
+        return hashlib.sha256(f"{username}\x00{text}".encode("utf-8")).hexdigest()
+    
+    def issue(self, username: str, text: str, templates: Union[str, List[str], None],
+              analysis: Dict) -> str:
+        """Store an analysis and return the token that redeems it"""
+        token = secrets.token_urlsafe(24)
+        now = time.monotonic()
+        with self.lock:
+            # Drop expired tokens, then the oldest ones if we are still full
+            self.tokens = {t: v for t, v in self.tokens.items() if v["expires_at"] > now}
+            while len(self.tokens) >= self.max_tokens:
+                self.tokens.pop(next(iter(self.tokens)))
+            self.tokens[token] = {
+                "expires_at": now + self.ttl_seconds,
+                "fingerprint": self._fingerprint(username, text),
+                "templates": templates,
+                "analysis": analysis
+            }
+        return token
+    
+    def redeem(self, token: str, username: str, text: str,
+               templates: Union[str, List[str], None] = None) -> Optional[Dict]:
+        """Return the stored analysis if the token is valid for this entry, else None"""
+        with self.lock:
+            stored = self.tokens.get(token)
+            if not stored or stored["expires_at"] <= time.monotonic():
+                self.tokens.pop(token, None)
+                return None
+            if stored["fingerprint"] != self._fingerprint(username, text):
+                return None
+            if templates is not None and templates != stored["templates"]:
+                return None
+            del self.tokens[token]
+        return stored["analysis"]
+
+class RateLimiter:
+    """Spaces calls out to at most `rate` per second across threads"""
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
 # Journal Repository interface
 class JournalRepository(ABC):
     @abstractmethod
-    def save_journal(self, username: str, text: str, title: str, classification: Dict) -> str:
+    def save_journal(self, username: str, text: str, title: str, classification: Dict,
+                     entry_id: Optional[str] = None) -> str:
+        pass
+    
+    @abstractmethod
+    def save_journals(self, username: str, entries: List[Dict]) -> bool:
+        pass
+    
+    @abstractmethod
+    def update_journal_classification(self, username: str, entry_id: str,
+                                      classification: Dict) -> bool:
         pass
         
     @abstractmethod
-    def get_user_history(self, username: str) -> List[Dict]:
+    def get_user_history(self, username: str, start: Optional[str] = None,
+                         end: Optional[str] = None, limit: Optional[int] = None,
+                         after: Optional[Tuple[str, Optional[str]]] = None) -> List[Dict]:
+        pass
+    
+    @abstractmethod
+    def iter_user_history(self, username: str, after: Optional[Tuple[str, Optional[str]]] = None,
+                          batch_size: int = 500) -> Iterator[Dict]:
+        pass
+    
+    @abstractmethod
+    def user_exists(self, username: str) -> bool:
+        pass
+    
+    @abstractmethod
+    def get_user_version(self, username: str) -> Optional[int]:
+        pass
+    
+    @abstractmethod
+    def get_changes_since(self, username: str, since: Optional[str] = None,
+                          start: Optional[str] = None, end: Optional[str] = None) -> Optional[Dict]:
         pass
     
     @abstractmethod
     def get_user_activities(self, username: str, include_completed: bool = False) -> List[Dict]:
         pass
     
+    @abstractmethod
+    def get_daily_mood(self, username: str, start: Optional[str] = None,
+                       end: Optional[str] = None, tz: Optional[str] = None) -> List[Dict]:
+        pass
+    
+    @abstractmethod
+    def get_emotion_points(self, username: str, start: Optional[str] = None,
+                           end: Optional[str] = None) -> List[Dict]:
+        pass
+    
+    @abstractmethod
+    def get_mood_rollups(self, username: str, period: str = "day", start: Optional[str] = None,
+                         end: Optional[str] = None) -> List[Dict]:
+        pass
+    
+    @abstractmethod
+    def search_entries(self, username: str, query: str, limit: int = 20,
+                       offset: int = 0) -> List[Dict]:
+        pass
+    
+    @abstractmethod
+    def find_similar_entries(self, username: str, entry_id: Optional[str] = None,
+                             text: Optional[str] = None, k: int = 5) -> Optional[List[Dict]]:
+        pass
+    
+    @abstractmethod
+    def get_top_terms(self, username: str, start: Optional[str] = None,
+                      end: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        pass
+    
     @abstractmethod
     def update_activity_status(self, username: str, activity_id: str, 
                               completed: bool, rating: Optional[int] = None, 
@@ -177,19 +324,80 @@ class MongoJournalRepository(JournalRepository):
     def __init__(self):
         self.repository = database_layer
     
-    def save_journal(self, username: str, text: str, title: str, classification: Dict) -> str:
-        success = self.repository.add_journal_entry(username, text, title, classification)
+    def save_journal(self, username: str, text: str, title: str, classification: Dict,
+                     entry_id: Optional[str] = None) -> str:
+        success = self.repository.add_journal_entry(username, text, title, classification, entry_id)
         return "Journal saved" if success else "Failed to save journal"
     
-    def get_user_history(self, username: str) -> List[Dict]:
-        history = self.repository.get_user_journal_entries(username)
+    def save_journals(self, username: str, entries: List[Dict]) -> bool:
+        """Save several analyzed entries in one write"""
+        return self.repository.add_journal_entries(username, entries)
+    
+    def update_journal_classification(self, username: str, entry_id: str,
+                                      classification: Dict) -> bool:
+        """Replace the classification of a saved journal entry"""
+        return self.repository.update_journal_entry_classification(username, entry_id, classification)
+    
+    def get_user_history(self, username: str, start: Optional[str] = None,
+                         end: Optional[str] = None, limit: Optional[int] = None,
+                         after: Optional[Tuple[str, Optional[str]]] = None) -> List[Dict]:
+        history = self.repository.get_user_journal_entries(
+            username, start=start, end=end, limit=limit, after=after)
         return history or []
     
+    def iter_user_history(self, username: str, after: Optional[Tuple[str, Optional[str]]] = None,
+                          batch_size: int = 500) -> Iterator[Dict]:
+        """Stream journal entries oldest first without loading them all"""
+        return self.repository.iter_journal_entries(username, after=after, batch_size=batch_size)
+    
+    def user_exists(self, username: str) -> bool:
+        # The version lookup reads one field of the user document
+        return self.repository.get_user_version(username) is not None
+    
+    def get_user_version(self, username: str) -> Optional[int]:
+        """Get the counter bumped on every write to the user's entries, activities or templates"""
+        return self.repository.get_user_version(username)
+    
+    def get_changes_since(self, username: str, since: Optional[str] = None,
+                          start: Optional[str] = None, end: Optional[str] = None) -> Optional[Dict]:
+        """Get entries and activities changed after `since`"""
+        return self.repository.get_changes_since(username, since, start, end)
+    
     def get_user_activities(self, username: str, include_completed: bool = False) -> List[Dict]:
         """Get suggested activities for a user"""
         activities = self.repository.get_user_activities(username, include_completed)
         return activities or []
     
+    def get_daily_mood(self, username: str, start: Optional[str] = None,
+                       end: Optional[str] = None, tz: Optional[str] = None) -> List[Dict]:
+        """Get per-day average emotion scores, aggregated in the database"""
+        return self.repository.get_daily_mood(username, start, end, tz)
+    
+    def get_emotion_points(self, username: str, start: Optional[str] = None,
+                           end: Optional[str] = None) -> List[Dict]:
+        """Get the timestamp and emotion scores of each entry"""
+        return self.repository.get_emotion_points(username, start, end)
+    
+    def search_entries(self, username: str, query: str, limit: int = 20,
+                       offset: int = 0) -> List[Dict]:
+        """Get entries matching a text query, best match first"""
+        return self.repository.search_entries(username, query, limit, offset)
+    
+    def find_similar_entries(self, username: str, entry_id: Optional[str] = None,
+                             text: Optional[str] = None, k: int = 5) -> Optional[List[Dict]]:
+        """Get the entries most similar to a saved entry or to a text"""
+        return self.repository.find_similar_entries(username, entry_id, text, k)
+    
+    def get_top_terms(self, username: str, start: Optional[str] = None,
+                      end: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Get the most frequent words in a date range"""
+        return self.repository.get_top_terms(username, start, end, limit)
+    
+    def get_mood_rollups(self, username: str, period: str = "day", start: Optional[str] = None,
+                         end: Optional[str] = None) -> List[Dict]:
+        """Get precomputed day/week/month mood averages"""
+        return self.repository.get_mood_rollups(username, period, start, end)
+    
     def update_activity_status(self, username: str, activity_id: str, 
                               completed: bool, rating: Optional[int] = None, 
                               notes: Optional[str] = None) -> bool:
@@ -207,29 +415,66 @@ class MongoJournalRepository(JournalRepository):
 
 # Journal Service
 class JournalService:
-    def __init__(self, repository: JournalRepository, ml_service: Optional[MLService] = None):
+    def __init__(self, repository: JournalRepository, ml_service: Optional[MLService] = None,
+                 analysis_tokens: Optional[AnalysisTokenStore] = None,
+                 job_collection=None, bulk_concurrency: int = 4,
+                 bulk_rate_per_second: float = 5.0, sync_overlap_seconds: float = 300.0):
         self.repository = repository
+        self.sync_overlap_seconds = sync_overlap_seconds
+        self.bulk_concurrency = bulk_concurrency
+        self.bulk_rate_per_second = bulk_rate_per_second
         self.ml_service = ml_service or MLService()
+        self.analysis_tokens = analysis_tokens or AnalysisTokenStore()
+        # Background analysis is only available when a job collection is configured
+        self.job_queue = (AnalysisJobQueue(job_collection, self.process_analysis_job,
+                                           on_failure=self.fail_analysis_job)
+                          if job_collection is not None else None)
     
     def analyze_journal(self, text: str, 
                         templates: Union[str, List[str]] = None,
                         custom_questions: List[str] = None,
-                        custom_format: Dict = None) -> Dict:
+                        custom_format: Dict = None,
+                        fused: Optional[bool] = None) -> Dict:
         command = AnalyzeJournalCommand(
             text, 
             self.ml_service,
             analysis_templates=templates,
             custom_questions=custom_questions,
-            custom_format=custom_format
+            custom_format=custom_format,
+            fused=fused
         )
         return command.execute()
     
-    def save_journal(self, username: str, text: str, title: str, classification: Dict) -> Dict:
+    def issue_analysis_token(self, username: str, text: str,
+                             templates: Union[str, List[str], None], analysis: Dict) -> Optional[str]:
+        """Keep a successful analysis so a later save can reuse it; returns its token"""
+        if not analysis or "error" in analysis:
+            return None
+        return self.analysis_tokens.issue(username, text, templates, analysis)
+    
+    def save_journal(self, username: str, text: str, title: str, classification: Dict,
+                     analysis_token: Optional[str] = None) -> Dict:
+        if analysis_token:
+            cached_analysis = self.analysis_tokens.redeem(analysis_token, username, text)
+            if cached_analysis:
+                classification = self._merge_adjusted_emotions(cached_analysis, classification)
+        
         command = SaveJournalCommand(
             self.repository, username, text, title, classification
         )
         return command.execute()
     
+    @staticmethod
+    def _merge_adjusted_emotions(analysis: Dict, classification: Optional[Dict]) -> Dict:
+        """Apply emotion values the user adjusted in the UI to a cached analysis"""
+        if not classification:
+            return analysis
+        if "emotion" in analysis:
+            merged = dict(analysis)
+            merged["emotion"] = classification
+            return merged
+        return classification
+    
     def suggest_activity(self, username: str, journal_analysis: Dict) -> Dict:
         """Suggest an activity based on journal analysis"""
         command = SuggestActivityCommand(username, journal_analysis)
@@ -247,15 +492,24 @@ class JournalService:
             username, activity_id, completed, rating, notes)
     
     def analyze_and_store_journal(self, username: str, text: str, title: str,
-                                  templates: Union[str, List[str]] = None) -> Dict:
+                                  templates: Union[str, List[str]] = None,
+                                  fused: Optional[bool] = None,
+                                  analysis_token: Optional[str] = None) -> Dict:
         # If no templates are explicitly provided, use the user's preferences
         if templates is None:
             user_templates = self.get_user_template_preferences(username)
             if user_templates:
                 templates = user_templates
         
-        # First analyze the journal
-        analysis_results = self.analyze_journal(text, templates=templates)
+        # Reuse the analysis from a previous "analyze" call when we have one
+        analysis_results = None
+        if analysis_token:
+            analysis_results = self.analysis_tokens.redeem(
+                analysis_token, username, text, templates)
+        
+        # Otherwise analyze the journal first
+        if analysis_results is None:
+            analysis_results = self.analyze_journal(text, templates=templates, fused=fused)
         # Then save the journal with the analysis results
         save_result = self.save_journal(username, text, title, analysis_results)
         
@@ -273,8 +527,321 @@ class JournalService:
         
         return result
     
-    def get_journal_history(self, username: str) -> List[Dict]:
-        return self.repository.get_user_history(username)
+    def analyze_and_store_journal_async(self, username: str, text: str, title: str,
+                                        templates: Union[str, List[str]] = None,
+                                        fused: Optional[bool] = None) -> Dict:
+        """Save the entry now with a pending classification and analyze it in the background"""
+        if self.job_queue is None:
+            raise RuntimeError("Background analysis is not configured")
+        
+        if templates is None:
+            templates = self.get_user_template_preferences(username)
+        
+        entry_id = uuid.uuid4().hex
+        message = self.repository.save_journal(
+            username, text, title, {"status": "pending"}, entry_id=entry_id)
+        if message != "Journal saved":
+            return {"save_status": False, "message": message}
+        
+        job_id = self.job_queue.enqueue({
+            "username": username,
+            "entry_id": entry_id,
+            "text": text,
+            "templates": templates,
+            "fused": fused
+        })
+        
+        return {
+            "save_status": True,
+            "message": message,
+            "entry_id": entry_id,
+            "job_id": job_id,
+            "status": "pending"
+        }
+    
+    def analyze_and_store_many(self, username: str, entries: List[Dict],
+                               templates: Union[str, List[str]] = None,
+                               fused: Optional[bool] = None) -> Dict:
+        """Analyze a batch of entries concurrently and store them with one write
+        
+        Entries that already carry a `classification` are stored as given.
+        Activity suggestion runs once, on the batch's average emotions.
+        """
+        if templates is None:
+            user_templates = self.get_user_template_preferences(username)
+            if user_templates:
+                templates = user_templates
+        
+        rate_limiter = RateLimiter(self.bulk_rate_per_second)
+        
+        def analyze(entry: Dict) -> Dict:
+            if entry.get("classification"):
+                return entry["classification"]
+            rate_limiter.wait()
+            return self.analyze_journal(entry["text"], templates=templates, fused=fused)
+        
+        # A dedicated pool: MLService's own pool runs the per-template calls
+        with ThreadPoolExecutor(max_workers=self.bulk_concurrency) as executor:
+            futures = [executor.submit(analyze, entry) for entry in entries]
+        
+        results = []
+        to_store = []
+        for index, (entry, future) in enumerate(zip(entries, futures)):
+            try:
+                analysis = future.result()
+            except Exception as e:
+                analysis = {"error": str(e)}
+            
+            if "error" in analysis:
+                results.append({"index": index, "title": entry.get("title"),
+                                "status": "failed", "error": analysis.get("error")})
+                continue
+            
+            entry_id = uuid.uuid4().hex
+            to_store.append({
+                "entry_id": entry_id,
+                "timestamp": entry.get("timestamp"),
+                "title": entry["title"],
+                "text": entry["text"],
+                "classification": analysis
+            })
+            results.append({"index": index, "title": entry.get("title"), "entry_id": entry_id,
+                            "status": "saved", "analysis": analysis})
+        
+        if to_store and not self.repository.save_journals(username, to_store):
+            for result in results:
+                if result["status"] == "saved":
+                    result.update({"status": "failed", "error": "Failed to save journal"})
+            to_store = []
+        
+        summary = {
+            "saved": sum(1 for result in results if result["status"] == "saved"),
+            "failed": sum(1 for result in results if result["status"] == "failed"),
+            "results": results,
+            "activity_suggested": False
+        }
+        
+        if to_store:
+            batch_emotions = self._average_emotions(
+                [stored["classification"] for stored in to_store])
+            if batch_emotions:
+                summary.update(self.suggest_activity(username, batch_emotions))
+        
+        return summary
+    
+    @staticmethod
+    def _average_emotions(analyses: List[Dict]) -> Dict:
+        """Average the emotion scores across several analyses"""
+        emotion_names = ["Joy", "Sadness", "Anger", "Fear", "Surprise", "Disgust"]
+        totals = {name: 0.0 for name in emotion_names}
+        count = 0
+        for analysis in analyses:
+            if not isinstance(analysis, dict):
+                continue
+            emotions = analysis.get("emotion", analysis)
+            if not isinstance(emotions, dict) or not any(name in emotions for name in emotion_names):
+                continue
+            for name in emotion_names:
+                value = emotions.get(name, 0)
+                totals[name] += value if isinstance(value, (int, float)) else 0
+            count += 1
+        if count == 0:
+            return {}
+        return {name: round(total / count) for name, total in totals.items()}
+    
+    def process_analysis_job(self, job: Dict) -> Dict:
+        """Worker for background analysis: analyze, store the result, suggest an activity"""
+        analysis_results = self.analyze_journal(
+            job["text"], templates=job.get("templates"), fused=job.get("fused"))
+        
+        if not self.repository.update_journal_classification(
+                job["username"], job["entry_id"], analysis_results):
+            raise RuntimeError(f"Could not store analysis for entry {job['entry_id']}")
+        
+        result = {"analysis": analysis_results}
+        result.update(self.suggest_activity(job["username"], analysis_results))
+        return result
+    
+    def fail_analysis_job(self, job: Dict, error: Exception) -> None:
+        """Replace the pending classification of a job's entry with a failed one"""
+        self.repository.update_journal_classification(
+            job["username"], job["entry_id"], {"status": "failed", "error": str(error)})
+    
+    def get_analysis_job(self, job_id: str) -> Optional[Dict]:
+        """Get the status of a background analysis job"""
+        if self.job_queue is None:
+            return None
+        return self.job_queue.get_job(job_id)
+    
+    def get_journal_history(self, username: str, start: Optional[str] = None,
+                            end: Optional[str] = None) -> List[Dict]:
+        return self.repository.get_user_history(username, start=start, end=end)
+    
+    def get_journal_history_page(self, username: str, start: Optional[str] = None,
+                                 end: Optional[str] = None, limit: Optional[int] = None,
+                                 cursor: Optional[str] = None) -> Dict:
+        """Get one page of journal history and the cursor for the next page"""
+        after = self.decode_history_cursor(cursor) if cursor else None
+        
+        # Ask for one extra entry so we know whether another page exists
+        entries = self.repository.get_user_history(
+            username, start=start, end=end,
+            limit=limit + 1 if limit else None, after=after)
+        
+        next_cursor = None
+        if limit and len(entries) > limit:
+            entries = entries[:limit]
+            last = entries[-1]
+            next_cursor = self.encode_history_cursor(last["timestamp"], last.get("entry_id"))
+        
+        return {"entries": entries, "next_cursor": next_cursor}
+    
+    def user_exists(self, username: str) -> bool:
+        return self.repository.user_exists(username)
+    
+    def get_user_version(self, username: str) -> Optional[int]:
+        return self.repository.get_user_version(username)
+    
+    def export_journal(self, username: str, since: Optional[str] = None,
+                       since_entry_id: Optional[str] = None, batch_size: int = 500) -> Iterator[Dict]:
+        """Iterate over a user's entries oldest first, resuming after the last exported entry.
+        
+        `since` and `since_entry_id` are the timestamp and entry_id of that
+        entry. With `since` alone, entries at that timestamp are sent again.
+        """
+        after = (since, since_entry_id) if since else None
+        return self.repository.iter_user_history(username, after=after, batch_size=batch_size)
+    
+    def sync_journal(self, username: str, cursor: Optional[str] = None,
+                     start: Optional[str] = None, end: Optional[str] = None) -> Optional[Dict]:
+        """Get entries and activities changed since `cursor`, plus the cursor for the next sync.
+        
+        Without a cursor everything in range is returned. The new cursor is the
+        latest change returned, so an empty sync hands back the same cursor.
+        
+        updated_at is wall-clock time stamped before the write commits, so a
+        write can land behind a cursor already handed out, or share its
+        timestamp. Each sync therefore re-reads `sync_overlap_seconds` before
+        the cursor; clients merge the results by entry_id and activity_id.
+        """
+        since = self.decode_cursor(cursor) if cursor else None
+        if since is not None and not isinstance(since, str):
+            raise ValueError(f"Invalid sync cursor: {cursor}")
+        read_from = None
+        if since is not None:
+            overlap = datetime.timedelta(seconds=self.sync_overlap_seconds)
+            read_from = (datetime.datetime.fromisoformat(since) - overlap).isoformat(timespec="microseconds")
+        changes = self.repository.get_changes_since(username, read_from, start, end)
+        if changes is None:
+            return None
+        
+        latest = since
+        for item in changes["entries"] + changes["activities"]:
+            changed_at = item.get("updated_at") or item.get("timestamp") or item.get("suggested_at")
+            if changed_at and (latest is None or str(changed_at) > latest):
+                latest = str(changed_at)
+        changes["cursor"] = self.encode_cursor(latest) if latest else None
+        return changes
+    
+    @staticmethod
+    def encode_cursor(value: Any) -> str:
+        """Encode a JSON value as an opaque cursor"""
+        return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Any:
+        """Decode a cursor produced by encode_cursor.
+        
+        Cursors issued before they carried JSON hold a bare timestamp,
+        which is returned as a string.
+        """
+        try:
+            decoded = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        except (ValueError, UnicodeError):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        try:
+            return json.loads(decoded)
+        except ValueError:
+            return decoded
+    
+    @classmethod
+    def encode_history_cursor(cls, timestamp: str, entry_id: Optional[str]) -> str:
+        """Encode the (timestamp, entry_id) of the last returned entry as an opaque cursor"""
+        return cls.encode_cursor([timestamp, entry_id])
+    
+    @classmethod
+    def decode_history_cursor(cls, cursor: str) -> Tuple[str, Optional[str]]:
+        """Decode a cursor produced by encode_history_cursor into (timestamp, entry_id)"""
+        position = cls.decode_cursor(cursor)
+        # Older cursors carry only the timestamp
+        if isinstance(position, str):
+            return position, None
+        if (isinstance(position, list) and len(position) == 2 and isinstance(position[0], str)
+                and (position[1] is None or isinstance(position[1], str))):
+            return position[0], position[1]
+        raise ValueError(f"Invalid history cursor: {cursor}")
+    
+    def get_mood_calendar(self, username: str, start: Optional[str] = None,
+                          end: Optional[str] = None, period: str = "day",
+                          tz: Optional[str] = None) -> List[Dict]:
+        """Get per-period entry counts and average emotion scores for the history calendar
+        
+        Reads the materialized rollups. Entries saved before rollups existed
+        have none until rebuild_mood_rollups.py runs, so daily values before
+        the first rollup are aggregated from raw entries. Weeks and months
+        show only rolled-up entries until then. Rollups are bucketed by UTC
+        date, so days in another time zone `tz` always come from raw entries.
+        """
+        if tz is not None and period == "day":
+            return self.repository.get_daily_mood(username, start, end, tz)
+        rollups = self.repository.get_mood_rollups(username, period, start, end)
+        if period != "day":
+            return rollups
+        if not rollups:
+            return self.repository.get_daily_mood(username, start, end)
+        earlier = self.repository.get_daily_mood(username, start, rollups[0]["date"])
+        return earlier + rollups
+    
+    def get_mood_timeseries(self, username: str, start: Optional[str] = None,
+                            end: Optional[str] = None, resolution: str = "day",
+                            max_points: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Get emotion series bucketed to `resolution`, each bucket with min/mean/max
+        
+        Bucketed resolutions read the mood rollups; "entry" reads one point per
+        entry. With `max_points`, longer series are downsampled with LTTB.
+        """
+        if resolution == "entry":
+            points = self.repository.get_emotion_points(username, start, end)
+            series = mood_timeseries.points_to_series(points)
+        else:
+            rollups = self.repository.get_mood_rollups(username, resolution, start, end)
+            series = mood_timeseries.rollups_to_series(rollups)
+        return mood_timeseries.downsample_series(series, max_points)
+    
+    def search_journal(self, username: str, query: str, limit: int = 20,
+                       offset: int = 0) -> Dict:
+        """Ranked search hits with highlighted snippets, and the offset of the next page"""
+        # Ask for one extra hit so we know whether another page exists
+        entries = self.repository.search_entries(username, query, limit + 1, offset)
+        next_offset = offset + limit if len(entries) > limit else None
+        terms = journal_search.query_terms(query)
+        return {
+            "results": [journal_search.to_hit(entry, terms) for entry in entries[:limit]],
+            "next_offset": next_offset
+        }
+    
+    def find_similar_entries(self, username: str, entry_id: Optional[str] = None,
+                             text: Optional[str] = None, k: int = 5) -> Optional[List[Dict]]:
+        """Past entries most similar to a saved entry or to text being written.
+        
+        Raises FeatureDisabledError when the embedding index is disabled.
+        """
+        return self.repository.find_similar_entries(username, entry_id=entry_id, text=text, k=k)
+    
+    def get_vocabulary(self, username: str, start: Optional[str] = None,
+                       end: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Top terms as [{"word", "frequency"}], read from the per-day term counts"""
+        return self.repository.get_top_terms(username, start, end, limit)
     
     def get_available_templates(self) -> List[str]:
         """Get list of all available analysis templates"""
@@ -287,6 +854,15 @@ class JournalService:
     def set_user_template_preferences(self, username: str, templates: List[str]) -> bool:
         """Set a user's template preferences"""
         return self.repository.set_user_template_preferences(username, templates)
+    
+    def get_metrics(self) -> Dict:
+        """Collect runtime counters from the services"""
+        return {
+            "analysis_cache": self.ml_service.get_cache_stats(),
+            "emotion_tiers": self.ml_service.get_tier_stats(),
+            "mongo_pool": database_layer.get_pool_metrics(),
+            "models": ModelRegistry.stats()
+        }
 
 # Service locator for global access to services
 class ServiceLocator:
@@ -297,10 +873,40 @@ class ServiceLocator:
         if cls._instance is None:
             cls._instance = cls()
             cls._instance.journal_repository = MongoJournalRepository()
-            cls._instance.ml_service = MLService()
+            cls._instance.ml_service = MLService(
+                # Defaults to one worker per template for each of web_threads request threads
+                max_workers=getattr(config, "analysis_max_workers", None) or
+                    getattr(config, "web_threads", MLService.DEFAULT_WEB_THREADS) *
+                    len(AnalysisTemplateRegistry.list_templates()),
+                template_timeout=getattr(config, "analysis_template_timeout", 60.0),
+                max_retries=getattr(config, "analysis_max_retries", 1),
+                cache_size=getattr(config, "analysis_cache_size", 256),
+                cache_store=cls._create_analysis_cache_store(),
+                tiered=getattr(config, "tiered_emotion_classifier", False),
+                local_confidence_threshold=getattr(config, "local_emotion_confidence", 0.6),
+                local_calibration=getattr(config, "local_emotion_calibration", None))
             cls._instance.journal_service = JournalService(
-                cls._instance.journal_repository, cls._instance.ml_service)
+                cls._instance.journal_repository, cls._instance.ml_service,
+                job_collection=database_layer.get_collection("analysis_jobs"),
+                sync_overlap_seconds=getattr(config, "sync_overlap_seconds", 300.0))
+            cls._instance.journal_service.job_queue.resume_unfinished()
+            # True warms every local model; a list warms only those
+            warmup_models = getattr(config, "warmup_models", False)
+            if warmup_models:
+                ModelRegistry.warmup(None if warmup_models is True else warmup_models)
         return cls._instance
+    
+    @staticmethod
+    def _create_analysis_cache_store():
+        """Build the persistent analysis cache tier configured in config.py, if any"""
+        backend = getattr(config, "analysis_cache_backend", None)
+        ttl_seconds = getattr(config, "analysis_cache_ttl", 7 * 24 * 3600)
+        if backend == "sqlite":
+            path = getattr(config, "analysis_cache_path", "analysis_cache.sqlite3")
+            return SQLiteAnalysisCacheStore(path, ttl_seconds)
+        if backend == "mongo":
+            return MongoAnalysisCacheStore(database_layer.get_collection("analysis_cache"), ttl_seconds)
+        return None
 
 # For backward compatibility
 def analyzeAndStoreJournal(username: str, text: str, title: str) -> Dict:
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Add a local sentiment classification (classification.sentiment) to every
+analyzed journal entry that does not have one yet.
+
+Entries from all users are streamed with a cursor and classified in
+batches. Progress is checkpointed after every batch, so re-running the
+script after an interruption continues where it stopped. Use --reset to
+scan from the beginning again.
+"""
+
+import argparse
+import logging
+
+import database_layer
+from sentiment import SentimentBackfill
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill local sentiment for journal entries")
+    parser.add_argument("--batch-size", type=int, default=64, help="Entries per model batch and bulk write")
+    parser.add_argument("--limit", type=int, help="Stop after this many entries")
+    parser.add_argument("--reset", action="store_true", help="Ignore the saved checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    backfill = SentimentBackfill(
+        database_layer.get_repository(),
+        database_layer.get_collection("backfill_checkpoints"),
+        batch_size=args.batch_size
+    )
+    if args.reset:
+        backfill.reset()
+
+    stats = backfill.run(limit=args.limit)
+    print(f"Backfilled {stats['entries']} entries in {stats['seconds']}s "
+          f"({stats['entries_per_second']} entries/sec).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the repository's small lookups against reading the whole user document.
+
+Creates a temporary user with 5,000 journal entries, then times the
+repository methods behind template preferences, activities, the user
+existence check and get_user, next to an unprojected find_one of the same
+user. Bytes are the size of the server's replies, as seen by a command
+listener. The temporary user is removed afterwards.
+"""
+
+import argparse
+import datetime
+import logging
+import statistics
+import time
+
+import bson
+from pymongo import MongoClient, monitoring
+
+from config import mongo_db_name
+from database.client_provider import MongoClientProvider
+from database_layer import MongoRepository
+
+BENCH_USERNAME = "__benchmark_projection_user__"
+
+
+def build_user(entry_count):
+    """A user document shaped like real data, with `entry_count` analyzed entries"""
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    entries = []
+    for i in range(entry_count):
+        entries.append({
+            "entry_id": f"bench-{i}",
+            "timestamp": (start + datetime.timedelta(hours=6 * i)).isoformat(),
+            "title": f"Benchmark entry {i}",
+            "text": "Today I went for a walk and thought about work and family. " * 8,
+            "classification": {
+                "emotion": {
+                    "Joy": 40, "Sadness": 20, "Anger": 5, "Fear": 10, "Surprise": 15, "Disgust": 0,
+                    "Triggers": {"Joy": ["walk in the park"], "Fear": ["deadline at work"]}
+                },
+                "themes": {
+                    "themes": [{"name": "Work", "prominence": 6, "evidence": ["deadline at work"]}]
+                }
+            }
+        })
+    return {
+        "username": BENCH_USERNAME,
+        "entries": entries,
+        "suggested_activities": [{"activity_id": "mood_1", "activity_name": "Gratitude List",
+                                  "completed": False}],
+        "template_preferences": ["emotion", "themes"]
+    }
+
+
+class ReplySizeListener(monitoring.CommandListener):
+    """Adds up the BSON size of every command reply"""
+
+    def __init__(self):
+        self.reply_bytes = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.reply_bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def measure(call, listener, runs):
+    """Median latency in ms of `call`, and the reply bytes of one call"""
+    timings = []
+    for _ in range(runs):
+        before = listener.reply_bytes
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+        reply_bytes = listener.reply_bytes - before
+    return statistics.median(timings), reply_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare repository lookups with whole-document reads")
+    parser.add_argument("--entries", type=int, default=5000, help="Entries in the benchmark user")
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs per query")
+    args = parser.parse_args()
+
+    # The repository logs every lookup; keep that out of the timings
+    logging.getLogger("database_layer").setLevel(logging.WARNING)
+    listener = ReplySizeListener()
+    client = MongoClient(MongoClientProvider.connection_string(), event_listeners=[listener])
+    repository = MongoRepository(mongo_db_name, client=client)
+    collection = repository.users_collection
+    collection.delete_one({"username": BENCH_USERNAME})
+    collection.insert_one(build_user(args.entries))
+
+    lookups = [
+        ("template preferences", lambda: repository.get_user_template_preferences(BENCH_USERNAME)),
+        ("activities", lambda: repository.get_user_activities(BENCH_USERNAME, include_completed=True)),
+        ("user exists", lambda: repository.get_user_version(BENCH_USERNAME)),
+        ("get_user", lambda: repository.get_user(BENCH_USERNAME)),
+    ]
+    whole_document = lambda: collection.find_one({"username": BENCH_USERNAME})
+
+    try:
+        print(f"User with {args.entries} entries, median of {args.runs} runs\n")
+        print(f"{'lookup':<22}{'whole doc ms':>14}{'whole doc bytes':>17}{'method ms':>12}{'method bytes':>14}")
+        for name, call in lookups:
+            before_ms, before_bytes = measure(whole_document, listener, args.runs)
+            after_ms, after_bytes = measure(call, listener, args.runs)
+            print(f"{name:<22}{before_ms:>14.2f}{before_bytes:>17,}{after_ms:>12.2f}{after_bytes:>14,}")
+    finally:
+        collection.delete_one({"username": BENCH_USERNAME})
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
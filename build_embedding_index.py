@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Build the per-user embedding index used by /similar from existing journal
+entries. Entries saved afterwards are appended automatically, so this only
+needs to run once, or again if the index directory is lost or the
+embedding model changes. The index is off unless config sets
+embedding_index_enabled = True.
+"""
+
+import argparse
+
+import database_layer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the similar-entries embedding index")
+    parser.add_argument("--username", help="Only rebuild this user")
+    args = parser.parse_args()
+
+    stats = database_layer.rebuild_embeddings(args.username)
+    print(f"Embedded {stats['entries']} entries for {stats['users']} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Prepare journal_entries for /search: create the text index and add the
+`search_strings` field (trigger phrases and theme evidence) to entries
+saved before it was recorded on write.
+
+Requires the per-entry layout (repository_type = "mongo_entries").
+"""
+
+from database_layer import RepositoryFactory
+
+
+def main():
+    # Creating the repository creates the text index
+    repository = RepositoryFactory.create_repository("mongo_entries")
+    count = repository.backfill_search_strings()
+    print(f"Added search strings to {count} entries.")
+
+
+if __name__ == "__main__":
+    main()
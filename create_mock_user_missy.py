@@ -14,11 +14,11 @@ from typing import Dict, List, Any, Optional
 
 # Connect to MongoDB - adjust connection string as needed
 try:
-    # Load configuration from config.py if available
+    # Use the shared client configured in config.py if available
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-    from config import mongo_uri, mongo_db_name
-    client = MongoClient(mongo_uri)
-    db = client[mongo_db_name]
+    from database.client_provider import MongoClientProvider
+    client = MongoClientProvider.get_client()
+    db = MongoClientProvider.get_database()
 except (ImportError, ModuleNotFoundError):
     # Fallback to default connection if config not available
     client = MongoClient("mongodb://localhost:27017/")
@@ -0,0 +1,124 @@
+from pymongo import MongoClient, monitoring
+import threading
+import config
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so pool usage can be reported"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checked_out": 0,
+            "checked_in": 0,
+            "checkout_failures": 0,
+            "pools_cleared": 0
+        }
+
+    def _increment(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            metrics = dict(self.counters)
+        metrics["connections_open"] = metrics["connections_created"] - metrics["connections_closed"]
+        metrics["connections_in_use"] = metrics["checked_out"] - metrics["checked_in"]
+        return metrics
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._increment("checked_out")
+
+    def connection_checked_in(self, event):
+        self._increment("checked_in")
+
+
+class MongoClientProvider:
+    """Process-wide MongoClient shared by the web app, the Discord bot and scripts.
+
+    The client is created on first use, not at import time. Pool size,
+    timeouts, read preference and write concern come from config.py.
+    """
+
+    _client = None
+    _lock = threading.Lock()
+    _metrics = PoolMetricsListener()
+
+    @staticmethod
+    def connection_string():
+        """Build the connection string from config.py"""
+        mongo_uri = getattr(config, "mongo_uri", None)
+        if mongo_uri:
+            return mongo_uri
+        host = getattr(config, "mongo_host", "137.184.197.46")
+        port = getattr(config, "mongo_port", 27017)
+        return f"mongodb://admin:{config.mongo_pass}@{host}:{port}/"
+
+    @classmethod
+    def get_client(cls):
+        """Get the shared client, creating it on first use"""
+        if cls._client is None:
+            with cls._lock:
+                if cls._client is None:
+                    cls._client = MongoClient(
+                        cls.connection_string(),
+                        maxPoolSize=getattr(config, "mongo_max_pool_size", 100),
+                        minPoolSize=getattr(config, "mongo_min_pool_size", 0),
+                        connectTimeoutMS=getattr(config, "mongo_connect_timeout_ms", 10000),
+                        serverSelectionTimeoutMS=getattr(config, "mongo_server_selection_timeout_ms", 10000),
+                        socketTimeoutMS=getattr(config, "mongo_socket_timeout_ms", None),
+                        readPreference=getattr(config, "mongo_read_preference", "primary"),
+                        w=getattr(config, "mongo_write_concern", 1),
+                        event_listeners=[cls._metrics]
+                    )
+        return cls._client
+
+    @classmethod
+    def get_database(cls, name=None):
+        """Get a database on the shared client, defaulting to config.mongo_db_name"""
+        return cls.get_client()[name or config.mongo_db_name]
+
+    @classmethod
+    def pool_metrics(cls):
+        """Connection pool counters for the shared client"""
+        metrics = cls._metrics.snapshot()
+        metrics["connected"] = cls._client is not None
+        metrics["max_pool_size"] = getattr(config, "mongo_max_pool_size", 100)
+        return metrics
+
+    @classmethod
+    def close(cls):
+        """Close the shared client; the next get_client() call opens a new one"""
+        with cls._lock:
+            if cls._client is not None:
+                cls._client.close()
+                cls._client = None
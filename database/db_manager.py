@@ -1,18 +1,25 @@
 from pymongo import MongoClient
 import config
+from .client_provider import MongoClientProvider
 
 class DatabaseManager:
     """Manages database connections and operations"""
     
     def __init__(self, connection_string=None, db_name=None):
         """Initialize database connection"""
+        self.db_name = db_name or config.mongo_db_name
+        
+        # Only a custom connection string gets its own client; otherwise
+        # share the process-wide pooled client
         if connection_string:
             self.connection_string = connection_string
+            self.client = MongoClient(self.connection_string)
+            self.owns_client = True
         else:
-            self.connection_string = f"mongodb://admin:{config.mongo_pass}@{config.mongo_host}:{config.mongo_port}/"
+            self.connection_string = MongoClientProvider.connection_string()
+            self.client = MongoClientProvider.get_client()
+            self.owns_client = False
         
-        self.db_name = db_name or config.mongo_db_name
-        self.client = MongoClient(self.connection_string)
         self.db = self.client[self.db_name]
     
     def get_collection(self, collection_name):
@@ -21,5 +28,5 @@ class DatabaseManager:
     
     def close(self):
         """Close the database connection"""
-        if self.client:
-            self.client.close() 
\ No newline at end of file
+        if self.client and self.owns_client:
+            self.client.close() 
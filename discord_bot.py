@@ -1,3 +1,4 @@
+import asyncio
 import discord
 import config
 from api_clients.client_factory import AIClientFactory
@@ -39,6 +40,14 @@ async def on_message(message):
         if handler:
             await handler.handle(message, args)
 
+async def main():
+    try:
+        async with client:
+            await client.start(config.discord_api_key)
+    finally:
+        # Close the AI client's pooled HTTP session on shutdown
+        await ai_client.close()
+
 if __name__ == "__main__":
     print("Attempting to connect")
-    client.run(config.discord_api_key) 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
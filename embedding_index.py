@@ -0,0 +1,239 @@
+from typing import Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+from model_registry import ModelRegistry
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Mean-pooled, L2-normalized sentence embeddings as a float32 (n, dim) matrix"""
+    extractor = ModelRegistry.get("embedding")
+    vectors = []
+    for output in extractor(texts, truncation=True):
+        # One (tokens, dim) array per text
+        vectors.append(np.asarray(output[0], dtype=np.float32).mean(axis=0))
+    matrix = np.vstack(vectors).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def entry_text(entry: Dict) -> str:
+    return f"{entry.get('title') or ''}. {entry.get('text') or ''}"
+
+
+class EmbeddingIndex:
+    """Per-user sentence embeddings of journal entries, for similar-entry lookups.
+
+    Each user has a raw float32 matrix file (one normalized row per entry)
+    and a JSON-lines file with the entry_id, timestamp and title of each
+    row. New entries are appended to both, so saving never rewrites the
+    matrix. Appends hold an exclusive file lock and reads a shared one, so
+    several processes can share the directory. Recently used matrices stay
+    in memory until another process changes the files; a search is one
+    matrix-vector product and an argpartition.
+    """
+
+    def __init__(self, directory: str, embed: Callable[[List[str]], np.ndarray] = embed_texts,
+                 max_cached_users: int = 32):
+        self.directory = directory
+        self.embed = embed
+        self.max_cached_users = max_cached_users
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, username: str):
+        # Hashed, so any username is a safe file name
+        name = hashlib.sha1(username.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, name)
+        return base + ".f32", base + ".jsonl"
+
+    @contextmanager
+    def _file_lock(self, username: str, exclusive: bool):
+        """Lock a user's files against other processes; readers share, writers exclude"""
+        if fcntl is None:
+            yield
+            return
+        lock_path = self._paths(username)[0][:-len(".f32")] + ".lock"
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _signature(self, username: str):
+        """Size and mtime of a user's files, to spot appends by other processes"""
+        signature = []
+        for path in self._paths(username):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return None
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def _read(self, username: str):
+        """(matrix, rows, torn) from disk; torn if an interrupted append left partial or extra rows"""
+        vectors_path, rows_path = self._paths(username)
+        if not (os.path.exists(vectors_path) and os.path.exists(rows_path)):
+            return None, [], False
+
+        rows, torn = [], False
+        with open(rows_path, encoding="utf-8") as rows_file:
+            for line in rows_file:
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # Only the last line can be cut short
+                    torn = True
+                    break
+        if not rows:
+            return None, [], torn or os.path.getsize(vectors_path) > 0
+
+        dim = rows[0]["dim"]
+        raw = np.fromfile(vectors_path, dtype=np.float32)
+        matrix = raw[:len(raw) // dim * dim].reshape(-1, dim)
+        # An interrupted append can leave one file a row ahead of the other
+        count = min(len(rows), len(matrix))
+        torn = torn or len(raw) != count * dim or len(rows) != count
+        return matrix[:count], rows[:count], torn
+
+    def _current(self, username: str):
+        """(matrix, rows, torn) for a user, from memory unless the files changed; hold a file lock"""
+        signature = self._signature(username)
+        cached = self._cache.get(username)
+        if cached is not None and cached[3] == signature:
+            self._cache.move_to_end(username)
+            return cached[:3]
+        matrix, rows, torn = self._read(username)
+        self._remember(username, matrix, rows, torn, signature)
+        return matrix, rows, torn
+
+    def _remember(self, username: str, matrix, rows: List[Dict], torn: bool, signature) -> None:
+        self._cache[username] = (matrix, rows, torn, signature)
+        self._cache.move_to_end(username)
+        if len(self._cache) > self.max_cached_users:
+            self._cache.popitem(last=False)
+
+    def _load(self, username: str):
+        """(matrix, rows) for a user, from memory or disk"""
+        with self._file_lock(username, exclusive=False):
+            matrix, rows, _ = self._current(username)
+        return matrix, rows
+
+    @staticmethod
+    def _row(entry: Dict, dim: int) -> Dict:
+        return {
+            "entry_id": entry.get("entry_id") or str(entry.get("timestamp")),
+            "timestamp": entry.get("timestamp"),
+            "title": entry.get("title"),
+            "dim": dim
+        }
+
+    def _write(self, username: str, vectors: Optional[np.ndarray], rows: List[Dict], mode: str) -> None:
+        vectors_path, rows_path = self._paths(username)
+        with open(vectors_path, mode + "b") as vectors_file:
+            if vectors is not None:
+                vectors_file.write(vectors.astype(np.float32).tobytes())
+        with open(rows_path, mode, encoding="utf-8") as rows_file:
+            for row in rows:
+                rows_file.write(json.dumps(row, default=str) + "\n")
+
+    def add_entries(self, username: str, entries: List[Dict]) -> int:
+        """Embed new entries and append them to the user's index"""
+        entries = [entry for entry in entries if entry.get("text")]
+        if not entries:
+            return 0
+        vectors = self.embed([entry_text(entry) for entry in entries])
+        new_rows = [self._row(entry, vectors.shape[1]) for entry in entries]
+        with self._lock, self._file_lock(username, exclusive=True):
+            matrix, rows, torn = self._current(username)
+            if torn:
+                # Cut the files back to their whole rows, or new rows would be misaligned
+                self._write(username, matrix, rows, "w")
+            self._write(username, vectors, new_rows, "a")
+            matrix = vectors if matrix is None else np.vstack([matrix, vectors])
+            self._remember(username, matrix, rows + new_rows, False, self._signature(username))
+        return len(entries)
+
+    def rebuild(self, username: str, entries: Iterable[Dict], batch_size: int = 64) -> int:
+        """Replace a user's index with embeddings of `entries`"""
+        with self._lock, self._file_lock(username, exclusive=True):
+            self._cache.pop(username, None)
+            for path in self._paths(username):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        count = 0
+        batch = []
+        for entry in entries:
+            if not entry.get("text"):
+                continue
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                count += self.add_entries(username, batch)
+                batch = []
+        if batch:
+            count += self.add_entries(username, batch)
+        logger.info(f"Rebuilt embedding index for user: {username} from {count} entries")
+        return count
+
+    def search(self, username: str, vector: np.ndarray, k: int = 5,
+               exclude: Iterable[str] = ()) -> List[Dict]:
+        """The `k` entries most similar to a normalized vector, by cosine similarity"""
+        with self._lock:
+            matrix, rows = self._load(username)
+        if matrix is None or not len(matrix):
+            return []
+
+        scores = matrix @ vector.astype(np.float32)
+        excluded = set(exclude)
+        wanted = min(k + len(excluded), len(scores))
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for index in top:
+            row = rows[index]
+            if row["entry_id"] in excluded:
+                continue
+            results.append({
+                "entry_id": row["entry_id"],
+                "timestamp": row["timestamp"],
+                "title": row["title"],
+                "similarity": round(float(scores[index]), 4)
+            })
+            if len(results) >= k:
+                break
+        return results
+
+    def similar_to_text(self, username: str, text: str, k: int = 5) -> List[Dict]:
+        return self.search(username, self.embed([text])[0], k)
+
+    def similar_to_entry(self, username: str, entry_id: str, k: int = 5) -> Optional[List[Dict]]:
+        """Entries most similar to a saved entry; None if the entry is not indexed"""
+        with self._lock:
+            matrix, rows = self._load(username)
+        for index, row in enumerate(rows):
+            if row["entry_id"] == entry_id:
+                return self.search(username, matrix[index], k, exclude=[entry_id])
+        return None
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Export a user's journal entries to a file as NDJSON or a JSON array.
+
+Entries are read from a Mongo cursor in batches and written as they arrive,
+so memory stays flat however long the journal is. Use --since and
+--since-entry-id with the timestamp and entry_id of the last exported entry
+to resume an interrupted export.
+"""
+
+import argparse
+import sys
+
+import database_layer
+import journal_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a user's journal entries to a file")
+    parser.add_argument("username", help="User whose journal to export")
+    parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    parser.add_argument("--format", choices=list(journal_export.FORMATS), default="ndjson",
+                        help="ndjson writes one entry per line; json writes a single array")
+    parser.add_argument("--since", help="Timestamp of the last exported entry; later entries are exported")
+    parser.add_argument("--since-entry-id",
+                        help="entry_id of the last exported entry; without it, entries at --since are exported again")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress the output")
+    parser.add_argument("--batch-size", type=int, default=500, help="Entries fetched per round trip")
+    args = parser.parse_args()
+
+    after = (args.since, args.since_entry_id) if args.since else None
+    entries = database_layer.iter_journal_entries(args.username, after, args.batch_size)
+    chunks = journal_export.encode(entries, args.format)
+    if args.gzip:
+        chunks = journal_export.gzip_chunks(chunks)
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+from typing import Dict, Iterable, Iterator
+import zlib
+
+import serialization
+
+# Export formats: one JSON document per line, or a single JSON array
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json"
+}
+
+
+def ndjson_lines(entries: Iterable[Dict]) -> Iterator[bytes]:
+    """One newline-terminated JSON document per entry"""
+    serializer = serialization.get_serializer()
+    for entry in entries:
+        yield serializer.dumps(entry) + b"\n"
+
+
+def json_array_chunks(entries: Iterable[Dict]) -> Iterator[bytes]:
+    """A JSON array written one element at a time"""
+    serializer = serialization.get_serializer()
+    yield b"["
+    separator = b""
+    for entry in entries:
+        yield separator + serializer.dumps(entry)
+        separator = b","
+    yield b"]\n"
+
+
+def encode(entries: Iterable[Dict], export_format: str = "ndjson") -> Iterator[bytes]:
+    """Serialize entries lazily in the requested format"""
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}. Expected one of {list(FORMATS)}")
+    if export_format == "ndjson":
+        return ndjson_lines(entries)
+    return json_array_chunks(entries)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6,
+                flush_bytes: int = 64 * 1024) -> Iterator[bytes]:
+    """Compress a stream of chunks into one gzip stream.
+
+    Output is flushed roughly every `flush_bytes` of input so clients
+    receive data steadily instead of only at the end.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    pending = 0
+    for chunk in chunks:
+        output = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_bytes:
+            output += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if output:
+            yield output
+    yield compressor.flush()
@@ -0,0 +1,120 @@
+from typing import Any, Dict, List, Optional, Tuple
+import html
+import re
+
+from vocabulary import get_analyzer
+
+# Name of the compound (username, text) index on journal_entries
+SEARCH_INDEX_NAME = "entry_text_search"
+# Relative weight of each indexed field in the text score
+SEARCH_WEIGHTS = {"title": 5, "search_strings": 2, "text": 1}
+
+
+def search_strings(classification: Any) -> List[str]:
+    """Trigger phrases and theme evidence from a classification, for the text index.
+
+    Triggers are keyed by emotion name, so they cannot be indexed by path;
+    they are copied into a flat `search_strings` field on the entry instead.
+    """
+    strings = []
+    if not isinstance(classification, dict):
+        return strings
+
+    # Older entries store the emotion template at the top level
+    emotions = classification.get("emotion", classification)
+    triggers = emotions.get("Triggers") if isinstance(emotions, dict) else None
+    if isinstance(triggers, dict):
+        for phrases in triggers.values():
+            if isinstance(phrases, list):
+                strings.extend(phrase for phrase in phrases if isinstance(phrase, str))
+
+    themes = classification.get("themes")
+    if isinstance(themes, dict):
+        for theme in themes.get("themes") or []:
+            if isinstance(theme, dict):
+                strings.extend(e for e in theme.get("evidence") or [] if isinstance(e, str))
+    return strings
+
+
+# Suffixes dropped from query words so "walking" also highlights "walked"
+_SUFFIXES = ("ing", "ed", "es", "ly", "s")
+
+
+def _stem_prefix(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def query_terms(query: str) -> List[str]:
+    """Word prefixes of a search query worth highlighting, without negated (-word) terms"""
+    positive = " ".join(word for word in query.split() if not word.startswith("-"))
+    return list(dict.fromkeys(_stem_prefix(word) for word in get_analyzer()(positive)))
+
+
+def query_regexes(query: str) -> Tuple[List[str], List[str]]:
+    """Regexes for the wanted and the negated (-word) terms of a query, for layouts without a text index.
+
+    Like query_terms, each matches a word prefix, so "walking" also finds "walked".
+    """
+    negated = " ".join(word[1:] for word in query.split() if word.startswith("-"))
+    excluded = dict.fromkeys(_stem_prefix(word) for word in get_analyzer()(negated))
+    return ([r"\b" + re.escape(term) for term in query_terms(query)],
+            [r"\b" + re.escape(term) for term in excluded])
+
+
+def _term_pattern(terms: List[str]):
+    return re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+
+
+def highlight(text: Optional[str], terms: List[str], width: int = 160) -> Optional[str]:
+    """An HTML-escaped snippet around the first matching term, matches wrapped in <mark>.
+
+    Terms match at word starts, so "walk" also marks "walking" as the
+    stemmed text search would have matched it.
+    """
+    if not text:
+        return text
+    if not terms:
+        return html.escape(text[:width])
+
+    pattern = _term_pattern(terms)
+    first = pattern.search(text)
+    if first is None:
+        start, end = 0, width
+    else:
+        start = max(0, first.start() - width // 3)
+        end = start + width
+
+    snippet = text[start:end]
+    parts = []
+    position = 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        position = match.end()
+    parts.append(html.escape(snippet[position:]))
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    return prefix + "".join(parts) + suffix
+
+
+def to_hit(entry: Dict, terms: List[str]) -> Dict:
+    """A search result with highlighted title and text snippets"""
+    pattern = _term_pattern(terms) if terms else None
+    return {
+        "entry_id": entry.get("entry_id"),
+        "timestamp": entry.get("timestamp"),
+        "title": entry.get("title"),
+        "score": round(entry.get("score", 0.0), 3),
+        "highlights": {
+            "title": highlight(entry.get("title"), terms),
+            "text": highlight(entry.get("text"), terms),
+            "search_strings": [
+                highlight(string, terms) for string in entry.get("search_strings") or []
+                if pattern is not None and pattern.search(string)
+            ]
+        }
+    }
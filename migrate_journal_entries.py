@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Migrate journal entries from the embedded `user_table.entries` arrays into the
+per-entry `journal_entries` collection.
+
+Run this once before switching `repository_type = "mongo_entries"` in config.py.
+The migration is idempotent, so it can be re-run if it is interrupted.
+"""
+
+import argparse
+
+from database_layer import RepositoryFactory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move embedded journal entries into journal_entries")
+    parser.add_argument("--username", help="Only migrate this user")
+    parser.add_argument("--keep-embedded", action="store_true",
+                        help="Copy entries without removing them from user_table")
+    args = parser.parse_args()
+
+    repository = RepositoryFactory.create_repository("mongo_entries")
+    stats = repository.migrate_embedded_entries(
+        username=args.username,
+        remove_embedded=not args.keep_embedded
+    )
+    print(f"Migrated {stats['entries']} entries for {stats['users']} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional, Iterable
+import logging
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Local Hugging Face models, by registry name
+MODELS = {
+    "emotion": {"task": "text-classification", "model": "AdamCodd/tinybert-emotion-balanced"},
+    "sentiment": {"task": "sentiment-analysis", "model": None},
+    "embedding": {"task": "feature-extraction", "model": "sentence-transformers/all-MiniLM-L6-v2"}
+}
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _parameter_bytes(model_pipeline) -> Optional[int]:
+    """Size of the model weights, for PyTorch-backed pipelines"""
+    try:
+        return sum(p.numel() * p.element_size() for p in model_pipeline.model.parameters())
+    except Exception:
+        return None
+
+
+class ModelRegistry:
+    """Process-wide store of Hugging Face pipelines, each loaded at most once.
+
+    Models load lazily on first use, or up front with warmup(). Loading is
+    serialized per model, so concurrent first calls share one load, and the
+    loaded pipeline is reused by every caller and thread.
+    """
+
+    _pipelines = {}
+    _stats = {}
+    _lock = threading.Lock()
+    _load_locks = {}
+
+    @classmethod
+    def _load_lock(cls, name: str) -> threading.Lock:
+        with cls._lock:
+            return cls._load_locks.setdefault(name, threading.Lock())
+
+    @classmethod
+    def get(cls, name: str):
+        """Get the pipeline registered as `name`, loading it on first use"""
+        model_pipeline = cls._pipelines.get(name)
+        if model_pipeline is not None:
+            return model_pipeline
+
+        if name not in MODELS:
+            raise ValueError(f"Unknown model: {name}. Expected one of {list(MODELS)}")
+
+        with cls._load_lock(name):
+            if name not in cls._pipelines:
+                cls._pipelines[name] = cls._load(name)
+        return cls._pipelines[name]
+
+    @classmethod
+    def _load(cls, name: str):
+        from transformers import pipeline
+
+        spec = MODELS[name]
+        rss_before = _peak_rss_bytes()
+        started = time.perf_counter()
+        if spec["model"]:
+            model_pipeline = pipeline(spec["task"], model=spec["model"])
+        else:
+            model_pipeline = pipeline(spec["task"])
+        load_seconds = time.perf_counter() - started
+        rss_after = _peak_rss_bytes()
+
+        cls._stats[name] = {
+            "task": spec["task"],
+            "model": spec["model"] or model_pipeline.model.name_or_path,
+            "load_seconds": round(load_seconds, 3),
+            "parameter_bytes": _parameter_bytes(model_pipeline),
+            "peak_rss_growth_bytes": (rss_after - rss_before
+                                      if rss_before is not None and rss_after is not None else None)
+        }
+        logger.info(f"Loaded model {name} in {load_seconds:.2f}s")
+        return model_pipeline
+
+    @classmethod
+    def warmup(cls, names: Optional[Iterable[str]] = None) -> None:
+        """Load models now instead of on the first request; all models by default"""
+        for name in names or MODELS:
+            try:
+                cls.get(name)
+            except Exception as e:
+                logger.error(f"Failed to warm up model {name}: {e}")
+
+    @classmethod
+    def loaded(cls) -> List[str]:
+        return list(cls._pipelines)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict]:
+        """Load time and memory footprint of each loaded model"""
+        return {name: dict(stats) for name, stats in cls._stats.items()}
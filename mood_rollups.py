@@ -0,0 +1,205 @@
+from pymongo import ASCENDING, UpdateOne
+from typing import Dict, List, Any, Optional, Iterable
+import datetime
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Score fields of the `emotion` analysis template
+EMOTIONS = ["Joy", "Sadness", "Anger", "Fear", "Surprise", "Disgust"]
+PERIODS = ["day", "week", "month"]
+
+
+class MoodRollupStore:
+    """Per-user day/ISO-week/month sums of emotion and theme scores.
+
+    Each entry is folded into three rollup documents when it is written, so
+    chart queries read one document per period instead of every entry.
+    Emotions keep sum/count/min/max; themes keep sum/count of prominence.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index(
+            [("username", ASCENDING), ("period", ASCENDING), ("start", ASCENDING)]
+        )
+
+    @staticmethod
+    def period_keys(timestamp: Any) -> Dict[str, Dict[str, str]]:
+        """The rollup key and start date of each period containing `timestamp`"""
+        if isinstance(timestamp, datetime.datetime):
+            day = timestamp.date()
+        else:
+            day = datetime.date.fromisoformat(str(timestamp)[:10])
+        iso_year, iso_week, iso_weekday = day.isocalendar()
+        week_start = day - datetime.timedelta(days=iso_weekday - 1)
+        return {
+            "day": {"key": day.isoformat(), "start": day.isoformat()},
+            "week": {"key": f"{iso_year}-W{iso_week:02d}", "start": week_start.isoformat()},
+            "month": {"key": day.strftime("%Y-%m"), "start": day.replace(day=1).isoformat()}
+        }
+
+    @staticmethod
+    def _field_name(name: str) -> str:
+        """Theme names become field names, which may not contain '.' or start with '$'"""
+        return name.replace(".", "_").lstrip("$") or "_"
+
+    @classmethod
+    def extract_scores(cls, classification: Any) -> Dict[str, Dict[str, float]]:
+        """Pull numeric emotion scores and theme prominences out of a classification"""
+        scores = {"emotions": {}, "themes": {}}
+        if not isinstance(classification, dict):
+            return scores
+
+        # Older entries store the emotion scores at the top level
+        emotions = classification.get("emotion", classification)
+        if isinstance(emotions, dict):
+            for emotion in EMOTIONS:
+                value = emotions.get(emotion)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    scores["emotions"][emotion] = value
+
+        themes = classification.get("themes")
+        if isinstance(themes, dict):
+            for theme in themes.get("themes") or []:
+                if not isinstance(theme, dict) or not theme.get("name"):
+                    continue
+                prominence = theme.get("prominence")
+                if isinstance(prominence, (int, float)) and not isinstance(prominence, bool):
+                    name = cls._field_name(str(theme["name"]).strip().lower())
+                    scores["themes"][name] = scores["themes"].get(name, 0) + prominence
+        return scores
+
+    @staticmethod
+    def is_counted(classification: Any) -> bool:
+        """Whether an entry counts towards a rollup's entries, as in the raw daily mood"""
+        return not (isinstance(classification, dict) and
+                    classification.get("status") in ("pending", "failed"))
+
+    def _operations(self, username: str, timestamp: Any, classification: Any,
+                    count_entry: bool, previous: Any = None) -> List[UpdateOne]:
+        scores = self.extract_scores(classification)
+        increments, minimums, maximums = {}, {}, {}
+        # A new entry counts once analyzed; a replaced classification may start or stop it counting
+        increments["entries"] = int(self.is_counted(classification))
+        if not count_entry:
+            increments["entries"] -= int(self.is_counted(previous))
+        for emotion, value in scores["emotions"].items():
+            increments[f"emotions.{emotion}.sum"] = value
+            increments[f"emotions.{emotion}.count"] = 1
+            minimums[f"emotions.{emotion}.min"] = value
+            maximums[f"emotions.{emotion}.max"] = value
+        for theme, value in scores["themes"].items():
+            increments[f"themes.{theme}.sum"] = value
+            increments[f"themes.{theme}.count"] = 1
+
+        # Take back what a replaced classification contributed; min/max cannot be undone
+        replaced = self.extract_scores(previous)
+        for group in ("emotions", "themes"):
+            for name, value in replaced[group].items():
+                for field, amount in (("sum", value), ("count", 1)):
+                    key = f"{group}.{name}.{field}"
+                    increments[key] = increments.get(key, 0) - amount
+
+        increments = {key: amount for key, amount in increments.items() if amount}
+        if not increments and not minimums:
+            return []
+
+        update = {"$inc": increments} if increments else {}
+        if minimums:
+            update["$min"] = minimums
+            update["$max"] = maximums
+
+        operations = []
+        for period, period_key in self.period_keys(timestamp).items():
+            update_for_period = dict(update)
+            update_for_period["$setOnInsert"] = {
+                "username": username,
+                "period": period,
+                "key": period_key["key"],
+                "start": period_key["start"]
+            }
+            operations.append(UpdateOne(
+                {"_id": f"{username}|{period}|{period_key['key']}"},
+                update_for_period,
+                upsert=True
+            ))
+        return operations
+
+    def record(self, username: str, timestamp: Any, classification: Any,
+               count_entry: bool = True, previous: Any = None) -> None:
+        """Fold one entry into its day, week and month rollups in one round trip.
+
+        With count_entry False the entry is already stored and `previous`
+        is the classification this one replaces; its scores are subtracted
+        so a re-analysis does not count the entry twice.
+        """
+        operations = self._operations(username, timestamp, classification, count_entry, previous)
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def record_many(self, username: str, entries: Iterable[Dict]) -> None:
+        """Fold several entries into the rollups in one round trip"""
+        operations = []
+        for entry in entries:
+            operations.extend(self._operations(
+                username, entry["timestamp"], entry.get("classification"), True))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def rebuild(self, username: str, entries: Iterable[Dict], batch_size: int = 500) -> int:
+        """Recompute a user's rollups from raw entries"""
+        self.collection.delete_many({"username": username})
+        operations = []
+        count = 0
+        for entry in entries:
+            if not entry.get("timestamp"):
+                continue
+            operations.extend(self._operations(
+                username, entry["timestamp"], entry.get("classification"), True))
+            count += 1
+            if len(operations) >= batch_size:
+                self.collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        logger.info(f"Rebuilt mood rollups for user: {username} from {count} entries")
+        return count
+
+    def get(self, username: str, period: str = "day", start: Optional[str] = None,
+            end: Optional[str] = None) -> List[Dict]:
+        """Rollup documents for a user whose period starts in [start, end)"""
+        query = {"username": username, "period": period}
+        start_range = {}
+        if start is not None:
+            start_range["$gte"] = start[:10]
+        if end is not None:
+            start_range["$lt"] = end[:10]
+        if start_range:
+            query["start"] = start_range
+        return list(self.collection.find(query, {"_id": 0}).sort("start", ASCENDING))
+
+    @staticmethod
+    def summarize(rollup: Dict) -> Dict:
+        """Turn a rollup document into averages in the daily mood shape"""
+        summary = {
+            "date": rollup["start"],
+            "period": rollup["period"],
+            "key": rollup["key"],
+            "count": rollup.get("entries", 0)
+        }
+        emotions = rollup.get("emotions", {})
+        summary["ranges"] = {}
+        for emotion in EMOTIONS:
+            stats = emotions.get(emotion)
+            # A sum that only ever had zeros added is never written
+            summary[emotion] = round(stats.get("sum", 0) / stats["count"], 1) if stats and stats.get("count") else None
+            if stats and stats.get("count"):
+                summary["ranges"][emotion] = {"min": stats.get("min"), "max": stats.get("max")}
+        summary["themes"] = {
+            theme: round(stats.get("sum", 0) / stats["count"], 1)
+            for theme, stats in rollup.get("themes", {}).items() if stats.get("count")
+        }
+        return summary
@@ -0,0 +1,105 @@
+from typing import Dict, List, Any, Optional
+import datetime
+
+from mood_rollups import EMOTIONS
+
+# Resolutions served by the time-series endpoint; "entry" plots raw entries
+RESOLUTIONS = ["entry", "day", "week", "month"]
+
+
+def _to_epoch_seconds(value: Any) -> float:
+    if isinstance(value, datetime.datetime):
+        moment = value
+    else:
+        moment = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def rollups_to_series(rollups: List[Dict]) -> Dict[str, List[Dict]]:
+    """One min/mean/max point per rollup period for each emotion"""
+    series = {emotion: [] for emotion in EMOTIONS}
+    for rollup in rollups:
+        for emotion in EMOTIONS:
+            mean = rollup.get(emotion)
+            if mean is None:
+                continue
+            value_range = rollup.get("ranges", {}).get(emotion, {})
+            series[emotion].append({
+                "t": rollup["date"],
+                "count": rollup.get("count", 0),
+                "min": value_range.get("min", mean),
+                "mean": mean,
+                "max": value_range.get("max", mean)
+            })
+    return series
+
+
+def points_to_series(points: List[Dict]) -> Dict[str, List[Dict]]:
+    """One point per entry for each emotion; min, mean and max are the entry's score"""
+    series = {emotion: [] for emotion in EMOTIONS}
+    for point in points:
+        for emotion in EMOTIONS:
+            value = point.get(emotion)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                series[emotion].append({
+                    "t": point["timestamp"],
+                    "count": 1,
+                    "min": value,
+                    "mean": value,
+                    "max": value
+                })
+    return series
+
+
+def lttb(points: List[Dict], threshold: int, value_key: str = "mean") -> List[Dict]:
+    """Largest-Triangle-Three-Buckets downsampling to at most `threshold` points.
+
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with its neighbours, which preserves
+    the visual peaks and troughs of the series.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    xs = [_to_epoch_seconds(point["t"]) for point in points]
+    ys = [point[value_key] for point in points]
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    selected = 0
+
+    for bucket in range(threshold - 2):
+        # Average of the next bucket is the third triangle corner
+        next_start = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_count = max(next_end - next_start, 1)
+        average_x = sum(xs[next_start:next_end]) / next_count
+        average_y = sum(ys[next_start:next_end]) / next_count
+
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        anchor_x, anchor_y = xs[selected], ys[selected]
+
+        best_area = -1.0
+        best_index = start
+        for index in range(start, end):
+            area = abs((anchor_x - average_x) * (ys[index] - anchor_y)
+                       - (anchor_x - xs[index]) * (average_y - anchor_y))
+            if area > best_area:
+                best_area = area
+                best_index = index
+
+        sampled.append(points[best_index])
+        selected = best_index
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample_series(series: Dict[str, List[Dict]], max_points: Optional[int]) -> Dict[str, List[Dict]]:
+    """Apply LTTB to every emotion series longer than `max_points`"""
+    if not max_points:
+        return series
+    return {emotion: lttb(points, max_points) for emotion, points in series.items()}
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Recompute the materialized mood rollups (per-day, per-ISO-week and per-month
+emotion and theme sums) from the raw journal entries.
+
+New entries update the rollups as they are written; run this once after
+deploying rollups, after a migration, or if the rollups are ever suspected
+to have drifted.
+"""
+
+import argparse
+
+import database_layer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild mood_rollups from journal entries")
+    parser.add_argument("--username", help="Only rebuild this user")
+    args = parser.parse_args()
+
+    stats = database_layer.rebuild_mood_rollups(args.username)
+    print(f"Rebuilt rollups from {stats['entries']} entries for {stats['users']} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Recompute the per-user vocabulary documents (per-day and all-time term
+counts) from the raw journal entry text.
+
+New entries update the vocabulary as they are written; run this once to
+cover entries saved before word counts were recorded.
+"""
+
+import argparse
+
+import database_layer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild vocabulary term counts from journal entries")
+    parser.add_argument("--username", help="Only rebuild this user")
+    args = parser.parse_args()
+
+    stats = database_layer.rebuild_vocabulary(args.username)
+    print(f"Rebuilt vocabulary from {stats['entries']} entries for {stats['users']} users.")
+
+
+if __name__ == "__main__":
+    main()
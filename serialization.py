@@ -0,0 +1,154 @@
+from abc import ABC, abstractmethod
+from typing import Any, Optional, Tuple
+import datetime
+import decimal
+import gzip
+import json
+import logging
+import threading
+import uuid
+
+from bson import ObjectId, Decimal128
+import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert BSON and other non-JSON values found in Mongo documents"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResponseSerializer(ABC):
+    """Turns response payloads and stored documents into UTF-8 JSON bytes"""
+    name = None
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        pass
+
+
+class StdlibJSONSerializer(ResponseSerializer):
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=to_jsonable, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonSerializer(ResponseSerializer):
+    """orjson encodes datetime natively; to_jsonable covers the BSON types"""
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=to_jsonable, option=orjson.OPT_NON_STR_KEYS)
+
+
+class SerializerFactory:
+    @staticmethod
+    def create_serializer(serializer_type: Optional[str] = None) -> ResponseSerializer:
+        """Create a serializer; "auto" uses orjson when it is installed"""
+        serializer_type = serializer_type or getattr(config, "json_serializer", "auto")
+        if serializer_type == "auto":
+            serializer_type = "orjson" if orjson is not None else "json"
+        if serializer_type == "orjson":
+            return OrjsonSerializer()
+        elif serializer_type == "json":
+            return StdlibJSONSerializer()
+        else:
+            raise ValueError(f"Unsupported serializer type: {serializer_type}")
+
+
+_serializer = None
+_serializer_lock = threading.Lock()
+
+
+def get_serializer() -> ResponseSerializer:
+    """Get the process-wide serializer, creating it on first use"""
+    global _serializer
+    if _serializer is None:
+        with _serializer_lock:
+            if _serializer is None:
+                _serializer = SerializerFactory.create_serializer()
+                logger.info(f"Using {_serializer.name} serializer")
+    return _serializer
+
+
+def dumps(value: Any) -> bytes:
+    return get_serializer().dumps(value)
+
+
+def negotiate_encoding(accept_encoding: str, supported: Tuple[str, ...] = ("br", "gzip")) -> Optional[str]:
+    """Pick the supported encoding the client rates highest in Accept-Encoding; None for identity.
+
+    Encodings the header does not list take the q-value of `*`, q=0 rules
+    an encoding out, and the order of `supported` only breaks ties.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, *params = part.strip().split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in supported:
+        if coding == "br" and brotli is None:
+            continue
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        # Strictly greater, so earlier entries in `supported` win ties
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    # A client that rates plain responses higher gets them uncompressed
+    if best is not None and accepted.get("identity", 0.0) > best_quality:
+        return None
+    return best
+
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Compress bodies of at least `response_compression_min_bytes` for the client"""
+    if len(body) < getattr(config, "response_compression_min_bytes", 1024):
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding == "br":
+        return brotli.compress(body, quality=getattr(config, "brotli_quality", 5)), encoding
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=getattr(config, "gzip_level", 6)), encoding
+    return body, None
@@ -12,6 +12,9 @@ let userJson = {};
 let userJournalHistory = [];
 let selectedColorMetric = "combined"; // Default to combined view
 let dailyMoodAverages = {}; // Cache for calculated mood/urge averages
+let dailyMoodCalendar = {}; // Server-side daily emotion averages from /mood_calendar, by YYYY-MM-DD
+// Cursor from the last /sync call, so refreshes only download changes
+let historySync = { username: null, rangeKey: null, cursor: null };
 
 
 // Check if showNotification exists, if not, create a fallback
@@ -243,12 +246,113 @@ function handleColorMetricChange() {
     refreshCalendar();
 }
 
+/**
+ * Get the date range covered by the three-month calendar
+ * (previous, current and next month around the selected date)
+ * @returns {Object} - Object with `from` and `to` as YYYY-MM-DD strings
+ */
+function getThreeMonthRange() {
+    const dateParam = new URLSearchParams(window.location.search).get('date');
+    const currentDate = dateParam ? new Date(dateParam) : new Date();
+    
+    const rangeStart = new Date(currentDate.getFullYear(), currentDate.getMonth() - 1, 1);
+    const rangeEnd = new Date(currentDate.getFullYear(), currentDate.getMonth() + 2, 0);
+    
+    const toDateString = date =>
+        `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+    
+    return { from: toDateString(rangeStart), to: toDateString(rangeEnd) };
+}
+
+/**
+ * Merge changed entries from a delta sync into the loaded history
+ * @param {Array} entries - Entries already loaded
+ * @param {Array} changes - New or updated entries returned by /sync
+ * @returns {Array} - Merged entries, oldest first
+ */
+function mergeJournalEntries(entries, changes) {
+    // Syncs re-send recent changes, so entries are matched by id (or timestamp for old entries)
+    const merged = new Map();
+    entries.forEach(entry => merged.set(entry.entry_id || entry.timestamp, entry));
+    changes.forEach(entry => merged.set(entry.entry_id || entry.timestamp, entry));
+    return Array.from(merged.values())
+        .sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
+}
+
+/**
+ * The browser's time zone for server-side day bucketing: an IANA name, or a +HH:MM offset
+ * @returns {string} - Time zone for the `tz` query parameter
+ */
+function getClientTimeZone() {
+    const zone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    if (zone) {
+        return zone;
+    }
+    const offset = -new Date().getTimezoneOffset();
+    const sign = offset >= 0 ? '+' : '-';
+    const hours = String(Math.floor(Math.abs(offset) / 60)).padStart(2, '0');
+    const minutes = String(Math.abs(offset) % 60).padStart(2, '0');
+    return `${sign}${hours}:${minutes}`;
+}
+
+/**
+ * Fetch per-day emotion averages for the calendar, aggregated by the server
+ * @param {string} username - The username to fetch the calendar for
+ * @param {Object} range - {from, to} date range (YYYY-MM-DD)
+ * @returns {Promise} - Promise that resolves with the days keyed by date
+ */
+async function getMoodCalendarForUser(username, range) {
+    // URLSearchParams encodes a "+HH:MM" offset as %2B, so it is not read as a space
+    const params = new URLSearchParams(Object.assign({}, range, { tz: getClientTimeZone() }));
+    const response = await fetch(`http://127.0.0.1:8800/mood_calendar/${username}?${params.toString()}`);
+    if (!response.ok) {
+        throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+    }
+    const data = await response.json();
+    
+    dailyMoodCalendar = {};
+    (data.days || []).forEach(day => {
+        dailyMoodCalendar[day.date] = day;
+    });
+    console.log("Mood calendar days received:", Object.keys(dailyMoodCalendar).length);
+    return dailyMoodCalendar;
+}
+
+/**
+ * Fetch emotion series for the chart, one point per entry, downsampled by the server
+ * @param {string} username - The username to fetch the series for
+ * @param {Date} startDate - First day of the range
+ * @param {Date} endDate - Last day of the range
+ * @param {number} maxPoints - Most points to return per emotion
+ * @returns {Promise} - Promise that resolves with the series keyed by emotion
+ */
+async function getMoodTimeseriesForUser(username, startDate, endDate, maxPoints) {
+    const toDateString = date =>
+        `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+    const params = new URLSearchParams({
+        from: toDateString(startDate),
+        to: toDateString(endDate),
+        resolution: 'entry',
+        max_points: Math.round(maxPoints)
+    });
+    const response = await fetch(`http://127.0.0.1:8800/timeseries/${username}?${params.toString()}`);
+    if (!response.ok) {
+        throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+    }
+    const data = await response.json();
+    return data.series || {};
+}
+
 /**
  * Fetch journal history for the specified user
+ * 
+ * The first load for a user and range downloads every entry in the range;
+ * later loads send the sync cursor and only receive entries changed since.
  * @param {string} username - The username to fetch history for
+ * @param {Object} range - Optional {from, to} date range (YYYY-MM-DD) to limit the entries fetched
  * @returns {Promise} - Promise that resolves when history is loaded
  */
-async function getJournalHistoryForUser(username) {
+async function getJournalHistoryForUser(username, range = null) {
     // Get username from input field if not provided
     if (!username) {
         username = document.getElementById('historyUsername').value;
@@ -263,8 +367,17 @@ async function getJournalHistoryForUser(username) {
     console.log("Fetching journal history for user:", username);
 
     try {
-        // Make sure to use the correct API endpoint
-        const response = await fetch(`http://127.0.0.1:8800/history/${username}`);
+        // Only ask for changes when we already hold this user's entries for this range
+        const rangeKey = JSON.stringify(range);
+        const isDelta = Boolean(historySync.cursor) &&
+            historySync.username === username && historySync.rangeKey === rangeKey;
+        
+        const params = new URLSearchParams(range || {});
+        if (isDelta) {
+            params.set('since', historySync.cursor);
+        }
+        const syncUrl = `http://127.0.0.1:8800/sync/${username}?${params.toString()}`;
+        const response = await fetch(syncUrl);
         
         if (!response.ok) {
             const errorText = await response.text();
@@ -297,8 +410,14 @@ async function getJournalHistoryForUser(username) {
         userJournalHistory = data;
             console.log("Data is an array with", data.length, "entries");
         } else if (data.entries && Array.isArray(data.entries)) {
-            userJournalHistory = data.entries;
-            console.log("Data has entries array with", data.entries.length, "entries");
+            if (isDelta) {
+                userJournalHistory = mergeJournalEntries(userJournalHistory, data.entries);
+                console.log("Merged", data.entries.length, "changed entries");
+            } else {
+                userJournalHistory = data.entries;
+                console.log("Data has entries array with", data.entries.length, "entries");
+            }
+            historySync = { username, rangeKey, cursor: data.cursor };
         } else {
             console.warn("Unexpected data format, entries not found", data);
             userJournalHistory = [];
@@ -445,9 +564,11 @@ function showWeekOverview(startDate, endDate) {
         
         console.log(`Confirmed dates: ${startDate.toISOString()} to ${endDate.toISOString()}`);
         
-        // Use the already loaded data instead of making a new API call
-        // Create the line chart with the journal entries
-        createLineChart(userJournalHistory, startDate, endDate, chartContainer);
+        // Emotions are charted from the server's series; urges from the loaded entries
+        createLineChart(userJournalHistory, startDate, endDate, chartContainer).catch(error => {
+            console.error("Error loading week chart:", error);
+            chartContainer.innerHTML = `<div class="alert alert-danger">Error loading week overview: ${error.message}</div>`;
+        });
         
         // Build the journal entries list
         buildJournalTimesliceList(startDate, endDate, userJournalHistory);
@@ -832,31 +953,36 @@ function buildJournalTimesliceList(startDate, endDate, entries) {
  * @param {Date} endDate End date for filtering entries
  * @param {HTMLElement} container Container element for the chart
  */
-function createLineChart(entries, startDate, endDate, container) {
+async function createLineChart(entries, startDate, endDate, container) {
     // Get the display type from the dropdown
     const displayType = document.getElementById('displayType').value;
     const showUrges = displayType === "urges";
 
-    // Filter entries for the selected date range
-    const filteredEntries = entries.filter(entry => {
-        const entryDate = new Date(entry.timestamp);
-        return entryDate >= startDate && entryDate <= endDate;
-    });
-
-    // If no entries, show a message
-    if (!filteredEntries.length) {
-        container.textContent = 'No journal entries for the selected week.';
-        return;
-    }
-
-    // Sort entries by date (ascending)
-    filteredEntries.sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
+    // Set up chart dimensions
+    const margin = { top: 20, right: 80, bottom: 30, left: 50 };
+    const width = 650 - margin.left - margin.right;
+    const height = 300 - margin.top - margin.bottom;
 
     // Extract data and dates based on display type
     const chartData = {};
     const dates = [];
 
     if (showUrges) {
+        // Filter entries for the selected date range
+        const filteredEntries = entries.filter(entry => {
+            const entryDate = new Date(entry.timestamp);
+            return entryDate >= startDate && entryDate <= endDate;
+        });
+
+        // If no entries, show a message
+        if (!filteredEntries.length) {
+            container.textContent = 'No journal entries for the selected week.';
+            return;
+        }
+
+        // Sort entries by date (ascending)
+        filteredEntries.sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
+
         // Initialize urge data
         chartData.shopping = [];
         chartData.social_media = [];
@@ -893,47 +1019,24 @@ function createLineChart(entries, startDate, endDate, container) {
             }
         });
     } else {
-        // Initialize emotion data
-        chartData.joy = [];
-        chartData.sadness = [];
-        chartData.anger = [];
-        chartData.fear = [];
-        chartData.surprise = [];
-        chartData.disgust = [];
+        // One point per pixel is as much as the chart can show
+        const username = historySync.username || document.getElementById('historyUsername').value;
+        const series = await getMoodTimeseriesForUser(username, startDate, endDate, width);
 
-        filteredEntries.forEach(entry => {
-            const date = new Date(entry.timestamp);
-            dates.push(date);
-            
-            if (entry.classification) {
-                // Map emotion values to the chart data, handling both cases (Joy/joy)
-                const emotionData = entry.classification.emotion || entry.classification;
-                
-                if (emotionData) {
-                    const emotions = {
-                        joy: emotionData.joy || emotionData.Joy || 0,
-                        sadness: emotionData.sadness || emotionData.Sadness || 0,
-                        anger: emotionData.anger || emotionData.Anger || 0,
-                        fear: emotionData.fear || emotionData.Fear || 0,
-                        surprise: emotionData.surprise || emotionData.Surprise || 0,
-                        disgust: emotionData.disgust || emotionData.Disgust || 0
-                    };
-                    
-                    Object.keys(chartData).forEach(emotion => {
-                        chartData[emotion].push({
-                            date: date,
-                            value: emotions[emotion]
-                        });
-                    });
-                }
-            }
+        // Map the server's emotion names to the chart keys (Joy -> joy)
+        ['Joy', 'Sadness', 'Anger', 'Fear', 'Surprise', 'Disgust'].forEach(emotion => {
+            chartData[emotion.toLowerCase()] = (series[emotion] || []).map(point => {
+                const date = new Date(point.t);
+                dates.push(date);
+                return { date: date, value: point.mean };
+            });
         });
-    }
 
-    // Set up chart dimensions
-    const margin = { top: 20, right: 80, bottom: 30, left: 50 };
-    const width = 650 - margin.left - margin.right;
-    const height = 300 - margin.top - margin.bottom;
+        if (!dates.length) {
+            container.textContent = 'No journal entries for the selected week.';
+            return;
+        }
+    }
 
     // Clear previous chart if any
     container.innerHTML = '';
@@ -1184,31 +1287,29 @@ function checkMoodScore(date) {
     
     // Check if we have this date in our cache
     if (!dailyMoodAverages[dateStr]) {
-        // Not in cache, calculate averages for this date
+        // Not in cache: emotions come from the server's daily averages,
+        // urges are still averaged from the loaded entries
+        const serverDay = dailyMoodCalendar[dateStr];
         
-        if (!userJournalHistory || userJournalHistory.length === 0) {
-            return 'rgb(240, 240, 240)'; // Light gray for no data
-        }
-        
-        const entriesForDate = userJournalHistory.filter(entry => {
+        const entriesForDate = (userJournalHistory || []).filter(entry => {
             if (!entry || !entry.timestamp) return false;
             const entryDate = new Date(entry.timestamp);
             if (isNaN(entryDate.getTime())) return false; // Skip invalid dates
             return entryDate >= dateStart && entryDate <= dateEnd;
         });
         
-        if (entriesForDate.length === 0) {
+        if (!serverDay && entriesForDate.length === 0) {
             return 'rgb(240, 240, 240)'; // Light gray for no data
         }
         
-        // Initialize data objects
+        // Days without scored entries have null averages
         let emotionValues = {
-            joy: 0,
-            sadness: 0,
-            anger: 0,
-            fear: 0,
-            surprise: 0,
-            disgust: 0
+            joy: serverDay ? serverDay.Joy || 0 : 0,
+            sadness: serverDay ? serverDay.Sadness || 0 : 0,
+            anger: serverDay ? serverDay.Anger || 0 : 0,
+            fear: serverDay ? serverDay.Fear || 0 : 0,
+            surprise: serverDay ? serverDay.Surprise || 0 : 0,
+            disgust: serverDay ? serverDay.Disgust || 0 : 0
         };
         
         let urgeValues = {
@@ -1222,52 +1323,26 @@ function checkMoodScore(date) {
             procrastination: 0
         };
         
-        let emotionCount = 0;
         let urgeCount = 0;
         
-        // Calculate averages
+        // Calculate urge averages
         entriesForDate.forEach(entry => {
-            if (entry.classification) {
-                // Process emotions
-                const emotionData = entry.classification.emotion || entry.classification;
-                
-                if (emotionData) {
-                    emotionCount++;
-                    
-                    // Add up emotion values, checking both cases (Joy/joy)
-                    emotionValues.joy += emotionData.joy || emotionData.Joy || 0;
-                    emotionValues.sadness += emotionData.sadness || emotionData.Sadness || 0;
-                    emotionValues.anger += emotionData.anger || emotionData.Anger || 0;
-                    emotionValues.fear += emotionData.fear || emotionData.Fear || 0;
-                    emotionValues.surprise += emotionData.surprise || emotionData.Surprise || 0;
-                    emotionValues.disgust += emotionData.disgust || emotionData.Disgust || 0;
-                }
+            if (entry.classification && entry.classification.urges && entry.classification.urges.urges) {
+                urgeCount++;
+                const urges = entry.classification.urges.urges;
                 
-                // Process urges
-                if (entry.classification.urges && entry.classification.urges.urges) {
-                    urgeCount++;
-                    const urges = entry.classification.urges.urges;
-                    
-                    // Map urge values
-                    urgeValues.shopping += urges.Shopping || 0;
-                    urgeValues.socialmedia += urges.Social_Media || 0; // Note: different naming format
-                    urgeValues.food += urges.Food || 0;
-                    urgeValues.exercise += urges.Exercise || 0;
-                    urgeValues.work += urges.Work || 0;
-                    urgeValues.isolation += urges.Isolation || 0;
-                    urgeValues.substance += urges.Substance || 0;
-                    urgeValues.procrastination += urges.Procrastination || 0;
-                }
+                // Map urge values
+                urgeValues.shopping += urges.Shopping || 0;
+                urgeValues.socialmedia += urges.Social_Media || 0; // Note: different naming format
+                urgeValues.food += urges.Food || 0;
+                urgeValues.exercise += urges.Exercise || 0;
+                urgeValues.work += urges.Work || 0;
+                urgeValues.isolation += urges.Isolation || 0;
+                urgeValues.substance += urges.Substance || 0;
+                urgeValues.procrastination += urges.Procrastination || 0;
             }
         });
         
-        // Calculate averages for emotions
-        if (emotionCount > 0) {
-            Object.keys(emotionValues).forEach(key => {
-                emotionValues[key] = emotionValues[key] / emotionCount;
-            });
-        }
-        
         // Calculate averages for urges
         if (urgeCount > 0) {
             Object.keys(urgeValues).forEach(key => {
@@ -1895,8 +1970,9 @@ function initHistory() {
         return;
     }
     
-    // Load journal history for the user
-    getJournalHistoryForUser(username)
+    // Load journal history and the server's daily mood for the months shown in the calendar
+    const range = getThreeMonthRange();
+    Promise.all([getJournalHistoryForUser(username, range), getMoodCalendarForUser(username, range)])
         .then(() => {
             // Initialize the three-month calendar
             initThreeMonthCalendar();
@@ -1,6 +1,7 @@
 // Flag to track whether analysis has been performed
 let analysisDone = false;
 let currentAnalysis = null;
+let currentAnalysisToken = null; // Lets a later save reuse the server-side analysis
 let userTemplates = ["emotion"]; // Default template if none available
 let availableTemplateResults = {}; // Store results for all available templates
 
@@ -165,6 +166,8 @@ async function analyzeJournal() {
             throw new Error(result.error || 'Failed to analyze journal');
         }
         
+        currentAnalysisToken = response.headers.get('X-Analysis-Token');
+        
         console.log("Received analysis result:", result);
         
         // Check for top-level error
@@ -225,6 +228,7 @@ async function analyzeAndSaveJournal() {
                 title,
                 text,
                 templates: userTemplates, // Use the templates from API
+                analysis_token: currentAnalysisToken,
                 action: 'analyze_and_save'
             })
         });
@@ -334,6 +338,7 @@ async function submitJournal() {
                 title,
                 text,
                 classification,
+                analysis_token: currentAnalysisToken,
                 action: 'submit'
             })
         });
@@ -676,6 +681,7 @@ function resetAnalysisResults() {
     // Reset analysis flag and current analysis
     analysisDone = false;
     currentAnalysis = null;
+    currentAnalysisToken = null;
     availableTemplateResults = {};
     
     // Hide template visualizer
@@ -0,0 +1,147 @@
+from pymongo import ASCENDING, UpdateOne
+from typing import Callable, Dict, List, Any, Optional, Iterable
+from collections import Counter
+import datetime
+import logging
+import re
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Used when scikit-learn is not installed
+FALLBACK_STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers herself him himself his how i if in into is it its itself
+just me more most my myself no nor not now of off on once only or other our ours ourselves out
+over own same she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves
+""".split())
+
+_analyzer = None
+
+
+def get_analyzer() -> Callable[[str], List[str]]:
+    """The word analyzer shared by every call: lowercase, tokenize, drop English stop words.
+
+    Built once from scikit-learn's CountVectorizer, which needs no fitting to
+    analyze text, or from a regex and a small stop-word list without it.
+    """
+    global _analyzer
+    if _analyzer is None:
+        try:
+            from sklearn.feature_extraction.text import CountVectorizer
+            _analyzer = CountVectorizer(stop_words="english").build_analyzer()
+        except ImportError:
+            token_pattern = re.compile(r"(?u)\b\w\w+\b")
+            _analyzer = lambda text: [
+                token for token in token_pattern.findall(text.lower())
+                if token not in FALLBACK_STOP_WORDS
+            ]
+    return _analyzer
+
+
+def count_words(text: str) -> List[Dict[str, Any]]:
+    """Word counts of a text as [{"word", "frequency"}], most frequent first"""
+    if not isinstance(text, str) or not text:
+        return []
+    counts = Counter(get_analyzer()(text))
+    return [{"word": word, "frequency": frequency} for word, frequency in counts.most_common()]
+
+
+class VocabularyStore:
+    """Per-user term counts per day and across all time.
+
+    Each entry's word counts are $inc'd into its day document and the
+    user's cumulative document when it is written, so top terms for any
+    date range come from these documents instead of entry text.
+    """
+
+    ALL_TIME = "all"
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index([("username", ASCENDING), ("day", ASCENDING)])
+
+    @staticmethod
+    def _day(timestamp: Any) -> str:
+        if isinstance(timestamp, datetime.datetime):
+            return timestamp.date().isoformat()
+        return str(timestamp)[:10]
+
+    def _operations(self, username: str, timestamp: Any,
+                    word_frequencies: List[Dict]) -> List[UpdateOne]:
+        increments = {
+            f"terms.{term['word']}": term["frequency"]
+            for term in word_frequencies or []
+            if term.get("word") and not term["word"].startswith("$") and "." not in term["word"]
+        }
+        if not increments:
+            return []
+        day = self._day(timestamp)
+        return [
+            UpdateOne(
+                {"_id": f"{username}|{day}"},
+                {"$inc": increments, "$setOnInsert": {"username": username, "day": day}},
+                upsert=True
+            ),
+            UpdateOne(
+                {"_id": f"{username}|{self.ALL_TIME}"},
+                {"$inc": increments, "$setOnInsert": {"username": username, "day": self.ALL_TIME}},
+                upsert=True
+            )
+        ]
+
+    def record_many(self, username: str, entries: Iterable[Dict]) -> None:
+        """Merge the word counts of new entries in one round trip"""
+        operations = []
+        for entry in entries:
+            operations.extend(self._operations(
+                username, entry["timestamp"], count_words(entry.get("text"))))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def rebuild(self, username: str, entries: Iterable[Dict], batch_size: int = 500) -> int:
+        """Recompute a user's term counts from raw entry text"""
+        self.collection.delete_many({"username": username})
+        operations = []
+        count = 0
+        for entry in entries:
+            if not entry.get("timestamp"):
+                continue
+            operations.extend(self._operations(
+                username, entry["timestamp"], count_words(entry.get("text"))))
+            count += 1
+            if len(operations) >= batch_size:
+                self.collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        logger.info(f"Rebuilt vocabulary for user: {username} from {count} entries")
+        return count
+
+    def top_terms(self, username: str, start: Optional[str] = None,
+                  end: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most frequent terms for days in [start, end), as [{"word", "frequency"}]"""
+        if start is None and end is None:
+            match = {"_id": f"{username}|{self.ALL_TIME}"}
+        else:
+            day_range = {"$ne": self.ALL_TIME}
+            if start is not None:
+                day_range["$gte"] = start[:10]
+            if end is not None:
+                day_range["$lt"] = end[:10]
+            match = {"username": username, "day": day_range}
+
+        pipeline = [
+            {"$match": match},
+            {"$project": {"_id": 0, "terms": {"$objectToArray": "$terms"}}},
+            {"$unwind": "$terms"},
+            {"$group": {"_id": "$terms.k", "frequency": {"$sum": "$terms.v"}}},
+            {"$sort": {"frequency": -1, "_id": 1}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "word": "$_id", "frequency": 1}}
+        ]
+        return list(self.collection.aggregate(pipeline))